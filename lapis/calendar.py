@@ -0,0 +1,58 @@
+from heapq import heappop, heappush
+from itertools import count
+from typing import Callable, Coroutine, List, Tuple
+
+from usim import time
+
+from lapis.utilities.condition import Modification
+
+
+class CompletionCalendar(object):
+    """
+    Calendar of events that are due at a given time, such as the completion of
+    jobs.
+
+    Instead of running an activity per job that waits for the job to end,
+    drones put the completion of their jobs into a calendar. A single activity
+    then runs the completions in the order of their due time, and in the order
+    they were scheduled for the same time.
+
+    Events are kept in a heap, so scheduling an event and running the next one
+    takes logarithmic time in the number of scheduled events. Events due at the
+    same time as other activities, such as a negotiation cycle, may run in a
+    different order than with an activity per job.
+    """
+
+    def __init__(self):
+        self._events: List[Tuple[float, int, Callable, tuple]] = []
+        self._sequence = count()
+        self._scheduled = Modification()
+
+    def __len__(self):
+        return len(self._events)
+
+    def schedule(self, due: float, callback: Callable[..., Coroutine], *args):
+        """
+        Schedule ``await callback(*args)`` at the time `due`
+
+        :param due: time at which to run the event
+        :param callback: coroutine function to run
+        """
+        if not self._events or due < self._events[0][0]:
+            self._scheduled.set()
+        heappush(self._events, (due, next(self._sequence), callback, args))
+
+    async def run(self):
+        while True:
+            if not self._events:
+                await self._scheduled
+                self._scheduled.clear()
+                continue
+            due = self._events[0][0]
+            if time.now < due:
+                self._scheduled.clear()
+                # an earlier event may be scheduled while waiting
+                await ((time >= due) | self._scheduled)
+                continue
+            _, _, callback, args = heappop(self._events)
+            await callback(*args)
@@ -1,10 +1,12 @@
 import click
 import logging.handlers
+from functools import partial
 
 from cobald.monitor.format_json import JsonFormatter
 from cobald.monitor.format_line import LineProtocolFormatter
 
 from lapis.controller import SimulatedLinearController
+from lapis.job_cache import JobCache
 from lapis.job_io.htcondor import htcondor_job_reader
 from lapis.pool import StaticPool, Pool
 from lapis.pool_io.htcondor import htcondor_pool_reader
@@ -12,6 +14,7 @@ from lapis.job_io.swf import swf_job_reader
 
 from lapis.scheduler import CondorJobScheduler
 from lapis.simulator import Simulator
+from lapis.strategy import strategies
 
 from lapis.monitor import (
     LoggingSocketHandler,
@@ -32,11 +35,46 @@ pool_import_mapper = {"htcondor": htcondor_pool_reader}
 @click.option("--log-tcp", "log_tcp", is_flag=True)
 @click.option("--log-file", "log_file", type=click.File("w"))
 @click.option("--log-telegraf", "log_telegraf", is_flag=True)
+@click.option("--calendar", "calendar", is_flag=True)
+@click.option("--registry", "registry", is_flag=True)
+@click.option("--resource-type", "resource_types", multiple=True)
+@click.option("--max-resident-jobs", "max_resident_jobs", type=int)
+@click.option("--batch-submission", "batch_submission", is_flag=True)
+@click.option("--job-cache", "job_cache", type=click.Path(file_okay=False))
+@click.option(
+    "--strategy",
+    type=click.Choice(list(strategies.keys())),
+    default="gridka",
+    show_default=True,
+)
 @click.pass_context
-def cli(ctx, seed, until, log_tcp, log_file, log_telegraf):
+def cli(
+    ctx,
+    seed,
+    until,
+    log_tcp,
+    log_file,
+    log_telegraf,
+    calendar,
+    registry,
+    resource_types,
+    max_resident_jobs,
+    batch_submission,
+    job_cache,
+    strategy,
+):
     ctx.ensure_object(dict)
     ctx.obj["seed"] = seed
+    ctx.obj["calendar"] = calendar
+    ctx.obj["registry"] = registry
+    ctx.obj["resource_types"] = resource_types
+    ctx.obj["max_resident_jobs"] = max_resident_jobs
+    ctx.obj["batch_submission"] = batch_submission
+    ctx.obj["job_cache"] = JobCache(job_cache) if job_cache else None
     ctx.obj["until"] = until
+    ctx.obj["scheduler_type"] = partial(
+        CondorJobScheduler, strategy=strategies[strategy]()
+    )
     monitoring_logger = logging.getLogger()
     monitoring_logger.setLevel(logging.DEBUG)
     time_filter = SimulationTimeFilter()
@@ -74,12 +112,21 @@ def cli(ctx, seed, until, log_tcp, log_file, log_telegraf):
 @click.pass_context
 def static(ctx, job_file, pool_file):
     click.echo("starting static environment")
-    simulator = Simulator(seed=ctx.obj["seed"])
+    simulator = Simulator(
+        seed=ctx.obj["seed"],
+        calendar=ctx.obj["calendar"],
+        registry=ctx.obj["registry"],
+        resource_types=ctx.obj["resource_types"],
+        max_resident_jobs=ctx.obj["max_resident_jobs"],
+        batch_submission=ctx.obj["batch_submission"],
+    )
     file, file_type = job_file
     simulator.create_job_generator(
-        job_input=file, job_reader=job_import_mapper[file_type]
+        job_input=file,
+        job_reader=job_import_mapper[file_type],
+        cache=ctx.obj["job_cache"],
     )
-    simulator.create_scheduler(scheduler_type=CondorJobScheduler)
+    simulator.create_scheduler(scheduler_type=ctx.obj["scheduler_type"])
     for current_pool in pool_file:
         pool_file, pool_file_type = current_pool
         simulator.create_pools(
@@ -105,12 +152,21 @@ def static(ctx, job_file, pool_file):
 @click.pass_context
 def dynamic(ctx, job_file, pool_file):
     click.echo("starting dynamic environment")
-    simulator = Simulator(seed=ctx.obj["seed"])
+    simulator = Simulator(
+        seed=ctx.obj["seed"],
+        calendar=ctx.obj["calendar"],
+        registry=ctx.obj["registry"],
+        resource_types=ctx.obj["resource_types"],
+        max_resident_jobs=ctx.obj["max_resident_jobs"],
+        batch_submission=ctx.obj["batch_submission"],
+    )
     file, file_type = job_file
     simulator.create_job_generator(
-        job_input=file, job_reader=job_import_mapper[file_type]
+        job_input=file,
+        job_reader=job_import_mapper[file_type],
+        cache=ctx.obj["job_cache"],
     )
-    simulator.create_scheduler(scheduler_type=CondorJobScheduler)
+    simulator.create_scheduler(scheduler_type=ctx.obj["scheduler_type"])
     for current_pool in pool_file:
         file, file_type = current_pool
         simulator.create_pools(
@@ -143,12 +199,21 @@ def dynamic(ctx, job_file, pool_file):
 @click.pass_context
 def hybrid(ctx, job_file, static_pool_file, dynamic_pool_file):
     click.echo("starting hybrid environment")
-    simulator = Simulator(seed=ctx.obj["seed"])
+    simulator = Simulator(
+        seed=ctx.obj["seed"],
+        calendar=ctx.obj["calendar"],
+        registry=ctx.obj["registry"],
+        resource_types=ctx.obj["resource_types"],
+        max_resident_jobs=ctx.obj["max_resident_jobs"],
+        batch_submission=ctx.obj["batch_submission"],
+    )
     file, file_type = job_file
     simulator.create_job_generator(
-        job_input=file, job_reader=job_import_mapper[file_type]
+        job_input=file,
+        job_reader=job_import_mapper[file_type],
+        cache=ctx.obj["job_cache"],
     )
-    simulator.create_scheduler(scheduler_type=CondorJobScheduler)
+    simulator.create_scheduler(scheduler_type=ctx.obj["scheduler_type"])
     for current_pool in static_pool_file:
         file, file_type = current_pool
         simulator.create_pools(
@@ -4,7 +4,10 @@ def cobald_cost(simulator):
         result += 1
         tmp = 0
         for resource_key in drone.pool_resources:
-            tmp += drone.resources[resource_key] / drone.pool_resources[resource_key]
+            tmp += (
+                drone.theoretical_available_resources[resource_key]
+                / drone.pool_resources[resource_key]
+            )
         tmp /= len(drone.pool_resources)
         result -= tmp
     return result
@@ -16,7 +19,10 @@ def local_cobald_cost(pool):
         result += 1
         tmp = 0
         for resource_key in pool.resources:
-            tmp += drone.resources[resource_key] / pool.resources[resource_key]
+            tmp += (
+                drone.theoretical_available_resources[resource_key]
+                / pool.resources[resource_key]
+            )
         tmp /= len(pool.resources)
         result -= tmp
     return result
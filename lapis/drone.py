@@ -1,7 +1,10 @@
+from types import MappingProxyType
+
 from cobald import interfaces
-from usim import time, Scope, instant, Capacities, ResourcesUnavailable, Queue
+from usim import time, Scope, instant, Queue
 
 from lapis.job import Job
+from lapis.resources import ResourceSchema, ResourceVector, VectorView
 
 
 class ResourcesExceeded(Exception):
@@ -15,40 +18,65 @@ class Drone(interfaces.Pool):
         pool_resources: dict,
         scheduling_duration: float,
         ignore_resources: list = None,
+        calendar=None,
+        schema: ResourceSchema = None,
     ):
         """
         :param scheduler:
         :param pool_resources:
         :param scheduling_duration:
+        :param calendar: :py:class:`~lapis.calendar.CompletionCalendar` to
+                         complete jobs with instead of keeping an activity
+                         per running job
+        :param schema: :py:class:`~lapis.resources.ResourceSchema` to account
+                       the free and unused resources of the drone in
         """
         super(Drone, self).__init__()
         self.scheduler = scheduler
+        self._init_resources(pool_resources, ignore_resources, schema)
+        self.scheduling_duration = scheduling_duration
+        #: pool aggregating the allocation and utilisation of the drone
+        self._pool = None
+        self._job_queue = Queue()
+        self._calendar = calendar
+
+    def _init_resources(
+        self, pool_resources: dict, ignore_resources: list, schema: ResourceSchema
+    ):
+        """Initialise the resources, jobs and supply of a new drone"""
         self.pool_resources = pool_resources
-        self.resources = Capacities(**pool_resources)
-        # shadowing requested resources to determine jobs to be killed
-        self.used_resources = Capacities(**pool_resources)
-        if ignore_resources:
-            self._valid_resource_keys = [
-                resource
-                for resource in self.pool_resources
-                if resource not in ignore_resources
-            ]
+        # resources not claimed by jobs, as requested and as actually used
+        if schema is None:
+            self._free_resources = dict(pool_resources)
+            self._unused_resources = dict(pool_resources)
+            self._free_view = MappingProxyType(self._free_resources)
+            self._unused_view = MappingProxyType(self._unused_resources)
         else:
-            self._valid_resource_keys = self.pool_resources.keys()
-        self.scheduling_duration = scheduling_duration
+            self._free_resources = schema.vector(pool_resources)
+            self._unused_resources = schema.vector(pool_resources)
+            self._free_view = VectorView(self._free_resources)
+            self._unused_view = VectorView(self._unused_resources)
+        # resources the drone does not provide are never allocated
+        self._valid_resource_keys = [
+            resource
+            for resource, amount in self.pool_resources.items()
+            if amount > 0 and resource not in (ignore_resources or ())
+        ]
         self._supply = 0
         self.jobs = 0
-        self._allocation = None
-        self._utilisation = None
-        self._job_queue = Queue()
+        # all resources are free initially
+        self._allocation = 1.0
+        self._utilisation = 1.0
 
     @property
     def theoretical_available_resources(self):
-        return dict(self.resources.levels)
+        """Read-only view of the resources not requested by jobs"""
+        return self._free_view
 
     @property
     def available_resources(self):
-        return dict(self.used_resources.levels)
+        """Read-only view of the resources not used by jobs"""
+        return self._unused_view
 
     async def run(self):
         from lapis.monitor import sampling_required
@@ -59,7 +87,11 @@ class Drone(interfaces.Pool):
         await sampling_required.put(self)
         async with Scope() as scope:
             async for job, kill in self._job_queue:
-                scope.do(self._run_job(job=job, kill=kill))
+                if self._calendar is None:
+                    scope.do(self._run_job(job=job, kill=kill))
+                else:
+                    # the activity only starts the job and ends right away
+                    scope.do(self._start_job(job=job, kill=kill))
 
     @property
     def supply(self) -> float:
@@ -75,25 +107,30 @@ class Drone(interfaces.Pool):
 
     @property
     def utilisation(self) -> float:
-        if self._utilisation is None:
-            self._init_allocation_and_utilisation()
         return self._utilisation
 
     @property
     def allocation(self) -> float:
-        if self._allocation is None:
-            self._init_allocation_and_utilisation()
         return self._allocation
 
-    def _init_allocation_and_utilisation(self):
-        levels = self.resources.levels
+    def _update_allocation_and_utilisation(self):
+        """
+        Update allocation and utilisation after resources were claimed or
+        released, and propagate the change to the pool of the drone
+        """
+        free_resources, pool_resources = self._free_resources, self.pool_resources
         resources = []
         for resource_key in self._valid_resource_keys:
             resources.append(
-                getattr(levels, resource_key) / self.pool_resources[resource_key]
+                free_resources[resource_key] / pool_resources[resource_key]
+            )
+        allocation = max(resources, default=1.0)
+        utilisation = min(resources, default=1.0)
+        if self._pool is not None:
+            self._pool.drone_changed(
+                allocation - self._allocation, utilisation - self._utilisation
             )
-        self._allocation = max(resources)
-        self._utilisation = min(resources)
+        self._allocation, self._utilisation = allocation, utilisation
 
     async def shutdown(self):
         from lapis.monitor import sampling_required
@@ -121,43 +158,138 @@ class Drone(interfaces.Pool):
         async with Scope() as scope:
             from lapis.monitor import sampling_required
 
-            self._utilisation = self._allocation = None
-
             job_execution = scope.do(job.run(self))
             self.jobs += 1
-            try:
-                async with self.resources.claim(
-                    **job.resources
-                ), self.used_resources.claim(**job.used_resources):
-                    await sampling_required.put(self)
-                    if kill:
-                        for resource_key in job.resources:
-                            try:
-                                if (
-                                    job.resources[resource_key]
-                                    < job.used_resources[resource_key]
-                                ):
-                                    await instant
-                                    job_execution.cancel()
-                                    await instant
-                            except KeyError:
-                                # check is not relevant if the data is not stored
-                                pass
-                    self.scheduler.update_drone(self)
-                    await job_execution.done
-            except ResourcesUnavailable:
+            if await self._claim(job):
+                await sampling_required.put(self)
+                if kill and self._exceeds(job):
+                    await instant
+                    job_execution.cancel()
+                    await instant
+                self.scheduler.update_drone(self)
+                await job_execution.done
+                await self._release(job)
+            else:
                 await instant
                 job_execution.cancel()
                 await instant
-            except AssertionError:
-                await instant
-                job_execution.cancel()
-                await instant
-            self.jobs -= 1
-            await self.scheduler.job_finished(job)
-            self._utilisation = self._allocation = None
+            await self._finish_job(job)
+
+    async def _start_job(self, job: Job, kill: bool):
+        """
+        Start a job in the context of the given drone and schedule its
+        completion in the calendar of the drone. This is equivalent to
+        :py:meth:`_run_job`, but the activity ends as soon as the job is started
+        instead of lasting until the job completes.
+
+        :param job: the job to start
+        :param kill: if True, a job is killed when used resources exceed
+                     requested resources
+        """
+        from lapis.monitor import sampling_required
+
+        job.drone = self
+        self.jobs += 1
+        # claim before suspending, as when running the job in its activity
+        if not await self._claim(job):
+            await job.start(self)
+            await job.stop(successful=False)
+            await self._finish_job(job)
+            return
+        await job.start(self)
+        await sampling_required.put(self)
+        if kill and self._exceeds(job):
             self.scheduler.update_drone(self)
-            await sampling_required.put(self)
+            await self._stop_job(job, successful=False)
+            return
+        self.scheduler.update_drone(self)
+        self._calendar.schedule(time.now + job.walltime, self._stop_job, job, True)
+
+    async def _stop_job(self, job: Job, successful: bool):
+        await job.stop(successful=successful)
+        await self._release(job)
+        await self._finish_job(job)
+
+    async def _claim(self, job: Job) -> bool:
+        """
+        Claim the requested and used resources of `job` from the drone
+
+        The scheduler only assigns jobs that fit, so plain counters suffice
+        instead of :py:class:`usim.Capacities`: jobs never wait for resources
+        but fail immediately if they are overcommitted.
+
+        :param job: the job to claim resources for
+        :return: whether the resources were available and have been claimed
+        """
+        free_resources, unused_resources = self._free_resources, self._unused_resources
+        requested, used = job.resources, job.used_resources
+        if (
+            type(free_resources) is ResourceVector
+            and free_resources.compatible(requested)
+            and free_resources.compatible(used)
+        ):
+            if not (free_resources.holds(requested) and unused_resources.holds(used)):
+                return False
+            free_resources.decrease(requested)
+            unused_resources.decrease(used)
+        else:
+            for resources, available in (
+                (requested, free_resources),
+                (used, unused_resources),
+            ):
+                for resource_key, amount in resources.items():
+                    if (
+                        resource_key not in available
+                        or available[resource_key] < amount
+                    ):
+                        return False
+            for resource_key, amount in requested.items():
+                free_resources[resource_key] -= amount
+            for resource_key, amount in used.items():
+                unused_resources[resource_key] -= amount
+        self._update_allocation_and_utilisation()
+        # entering the claims of usim.Capacities suspended four times, keep
+        # doing so to run activities in the same order
+        for _ in range(4):
+            await instant
+        return True
+
+    async def _release(self, job: Job):
+        """Release the resources claimed by `job` from the drone"""
+        # leaving the claims of usim.Capacities suspended three times before
+        # and once after the requested resources were free again
+        for _ in range(3):
+            await instant
+        free_resources, unused_resources = self._free_resources, self._unused_resources
+        if type(free_resources) is ResourceVector and free_resources.compatible(
+            job.resources
+        ):
+            free_resources.increase(job.resources)
+            unused_resources.increase(job.used_resources)
+        else:
+            for resource_key, amount in job.resources.items():
+                free_resources[resource_key] += amount
+            for resource_key, amount in job.used_resources.items():
+                unused_resources[resource_key] += amount
+        self._update_allocation_and_utilisation()
+        await instant
+
+    @staticmethod
+    def _exceeds(job: Job) -> bool:
+        """Whether `job` uses more resources than it requested"""
+        return any(
+            job.resources[resource_key] < job.used_resources[resource_key]
+            for resource_key in job.resources
+            if resource_key in job.used_resources
+        )
+
+    async def _finish_job(self, job: Job):
+        from lapis.monitor import sampling_required
+
+        self.jobs -= 1
+        await self.scheduler.job_finished(job)
+        self.scheduler.update_drone(self)
+        await sampling_required.put(self)
 
     def __repr__(self):
         return "<%s: %s>" % (self.__class__.__name__, id(self))
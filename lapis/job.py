@@ -5,9 +5,11 @@ from usim import time
 from usim import CancelTask
 
 from lapis.monitor import sampling_required
+from lapis.utilities.condition import Modification
 
 if TYPE_CHECKING:
     from lapis.drone import Drone
+    from lapis.resources import ResourceSchema
 
 
 class Job(object):
@@ -24,6 +26,7 @@ class Job(object):
         "_name",
         "drone",
         "_success",
+        "_resident",
     )
 
     def __init__(
@@ -70,6 +73,17 @@ class Job(object):
         self.drone = drone
         self._name = name
         self._success: Optional[bool] = None
+        self._resident: Optional[ResidentJobs] = None
+
+    def vectorize(self, schema: "ResourceSchema"):
+        """
+        Store the requested and used resources as vectors of `schema`
+
+        :raises KeyError: if a resource type of the job is not part of `schema`
+        """
+        resources = schema.vector(self.resources)
+        used_resources = schema.vector(self.used_resources)
+        self.resources, self.used_resources = resources, used_resources
 
     @property
     def name(self) -> str:
@@ -92,37 +106,125 @@ class Job(object):
         return float("Inf")
 
     async def run(self, drone: "Drone"):
-        assert drone, "Jobs cannot run without a drone being assigned"
-        self.drone = drone
-        self.in_queue_until = time.now
-        self._success = None
-        await sampling_required.put(self)
+        await self.start(drone)
         try:
             await (time + self.walltime)
         except CancelTask:
-            self.drone = None
-            self._success = False
+            await self.stop(successful=False)
         except BaseException:
             self.drone = None
             self._success = False
             raise
         else:
-            self.drone = None
-            self._success = True
+            await self.stop(successful=True)
+
+    async def start(self, drone: "Drone"):
+        """
+        Mark the job as running on `drone`. Together with :py:meth:`stop`, this
+        allows to run the job without waiting for its walltime in :py:meth:`run`.
+        """
+        assert drone, "Jobs cannot run without a drone being assigned"
+        self.drone = drone
+        self.in_queue_until = time.now
+        self._success = None
+        await sampling_required.put(self)
+
+    async def stop(self, successful: bool):
+        """Mark the job as no longer running, see :py:meth:`start`"""
+        self.drone = None
+        self._success = successful
+        if successful and self._resident is not None:
+            self._resident.release()
+            self._resident = None
         await sampling_required.put(self)
 
     def __repr__(self):
         return "<%s: %s>" % (self.__class__.__name__, self._name or id(self))
 
 
-async def job_to_queue_scheduler(job_generator, job_queue):
+class ResidentJobs(object):
+    """
+    Number of jobs resident in a simulation, i.e. jobs that have been submitted
+    but did not finish successfully yet
+
+    If a `limit` is given, submitting a job is delayed while the limit is
+    reached. Successfully finished jobs are no longer tracked, so the number of
+    jobs in memory stays bounded independent of the length of the trace.
+
+    :param limit: maximum number of resident jobs
+    """
+
+    def __init__(self, limit: int = None):
+        assert limit is None or limit > 0, "At least one job must be resident"
+        self.limit = limit
+        #: number of resident jobs
+        self.count = 0
+        #: maximum number of jobs that have been resident at the same time
+        self.peak = 0
+        self._released = Modification()
+
+    @property
+    def full(self) -> bool:
+        """Whether the limit of resident jobs is reached"""
+        return self.limit is not None and self.count >= self.limit
+
+    async def admit(self, job: Job):
+        """Wait until `job` may become resident and track it"""
+        while self.full:
+            self._released.clear()
+            await self._released
+        self.count += 1
+        self.peak = max(self.peak, self.count)
+        job._resident = self
+
+    def release(self):
+        """Stop tracking a job that finished successfully"""
+        self.count -= 1
+        self._released.set()
+
+
+async def job_to_queue_scheduler(
+    job_generator,
+    job_queue,
+    schema: "ResourceSchema" = None,
+    resident_jobs: ResidentJobs = None,
+    batch: bool = False,
+):
+    """
+    Submit the jobs of `job_generator` to `job_queue` at their queue date,
+    relative to the queue date of the first job.
+
+    :param job_generator: iterable of jobs ordered by queue date
+    :param job_queue: queue to submit the jobs to
+    :param schema: schema to store the resources of the jobs in
+    :param resident_jobs: tracker of the jobs in the simulation
+    :param batch: whether to submit all jobs of a queue date as one list
+    """
     base_date = None
+    # jobs of the current queue date when submitting batches
+    jobs = []
     for job in job_generator:
+        if schema is not None:
+            job.vectorize(schema)
         if base_date is None:
             base_date = job.queue_date
         current_time = job.queue_date - base_date
         if time.now < current_time:
+            if jobs:
+                await job_queue.put(jobs)
+                jobs = []
             await (time >= current_time)
+        if resident_jobs is not None:
+            if jobs and resident_jobs.full:
+                # resident jobs cannot finish before they are submitted
+                await job_queue.put(jobs)
+                jobs = []
+            await resident_jobs.admit(job)
         job.in_queue_since = time.now
-        await job_queue.put(job)
+        if batch:
+            jobs.append(job)
+        else:
+            await job_queue.put(job)
+    if jobs:
+        await job_queue.put(jobs)
     await job_queue.close()
@@ -0,0 +1,94 @@
+import hashlib
+import inspect
+import os
+import shutil
+import tempfile
+from functools import partial
+
+from lapis.job_table import JobTable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#: version of the cache layout, changing it invalidates all cached traces
+CACHE_FORMAT = 1
+
+
+class JobCache(object):
+    """
+    Persistent cache of the jobs read from job inputs
+
+    The jobs of an input are read once and stored as a
+    :py:class:`~lapis.job_table.JobTable` in a subdirectory of the cache.
+    Later runs on the same input memory-map the stored table instead of
+    reading the input again. Tables are identified by the content of the
+    input, the extension of its file, and the job reader including the
+    resource mappings it is called with. Entries are not invalidated when the
+    implementation of a job reader changes, so the cache must be cleared in
+    this case.
+
+    :param directory: directory to store the tables in, created if needed
+    """
+
+    def __init__(self, directory: str):
+        assert numpy is not None, "JobCache requires numpy"
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def table(self, job_input, job_reader) -> JobTable:
+        """
+        Table of the jobs read from `job_input` by `job_reader`, read and
+        stored only if the cache does not provide it yet
+
+        :param job_input: seekable file to read jobs from
+        :param job_reader: callable creating jobs from the `job_input`
+        """
+        path = os.path.join(self.directory, self.key(job_input, job_reader))
+        if not os.path.isdir(path):
+            table = JobTable()
+            table.extend(job_reader(job_input))
+            # concurrent runs must only ever see complete tables
+            temporary = tempfile.mkdtemp(dir=self.directory, prefix=".")
+            table.save(temporary)
+            try:
+                os.rename(temporary, path)
+            except OSError:
+                # another run has stored the table meanwhile
+                shutil.rmtree(temporary)
+        return JobTable.load(path)
+
+    @staticmethod
+    def key(job_input, job_reader, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Key identifying the jobs read from `job_input` by `job_reader`
+
+        The content of `job_input` is read from its current position, which is
+        restored afterwards.
+        """
+        digest = hashlib.sha256()
+        reader, arguments = job_reader, ()
+        if isinstance(job_reader, partial):
+            reader = job_reader.func
+            arguments = job_reader.args, job_reader.keywords
+        digest.update(
+            repr(
+                (
+                    CACHE_FORMAT,
+                    reader.__module__,
+                    reader.__qualname__,
+                    arguments,
+                    # defaults such as the resource mappings of the reader
+                    str(inspect.signature(job_reader)),
+                    os.path.splitext(getattr(job_input, "name", ""))[1].lower(),
+                )
+            ).encode()
+        )
+        start = job_input.tell()
+        chunk = job_input.read(chunk_size)
+        while chunk:
+            digest.update(chunk.encode() if isinstance(chunk, str) else chunk)
+            chunk = job_input.read(chunk_size)
+        job_input.seek(start)
+        return digest.hexdigest()
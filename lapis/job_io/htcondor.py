@@ -1,45 +1,76 @@
 import csv
 import json
 import logging
+import re
+from itertools import islice
+from typing import Iterator, List, Optional
 
 from lapis.job import Job
-from copy import deepcopy
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#: default mapping of resource types to the columns of requested resources
+RESOURCE_NAME_MAPPING = {
+    "cores": "RequestCpus",
+    "walltime": "RequestWalltime",  # s
+    "memory": "RequestMemory",  # MiB
+    "disk": "RequestDisk",  # KiB
+}
+#: default mapping of resource types to the columns of used resources
+USED_RESOURCE_NAME_MAPPING = {
+    "queuetime": "QDate",
+    "walltime": "RemoteWallClockTime",  # s
+    "memory": "MemoryUsage",  # MB
+    "disk": "DiskUsage_RAW",  # KiB
+}
+#: default factors to convert the values of columns to the units of lapis
+UNIT_CONVERSION_MAPPING = {
+    "RequestCpus": 1,
+    "RequestWalltime": 1,
+    "RequestMemory": 1024 * 1024,
+    "RequestDisk": 1024,
+    "queuetime": 1,
+    "RemoteWallClockTime": 1,
+    "MemoryUsage": 1000 * 1000,
+    "DiskUsage_RAW": 1024,
+}
 
 
 def htcondor_job_reader(
     iterable,
-    resource_name_mapping={  # noqa: B006
-        "cores": "RequestCpus",
-        "walltime": "RequestWalltime",  # s
-        "memory": "RequestMemory",  # MiB
-        "disk": "RequestDisk",  # KiB
-    },
-    used_resource_name_mapping={  # noqa: B006
-        "queuetime": "QDate",
-        "walltime": "RemoteWallClockTime",  # s
-        "memory": "MemoryUsage",  # MB
-        "disk": "DiskUsage_RAW",  # KiB
-    },
-    unit_conversion_mapping={  # noqa: B006
-        "RequestCpus": 1,
-        "RequestWalltime": 1,
-        "RequestMemory": 1024 * 1024,
-        "RequestDisk": 1024,
-        "queuetime": 1,
-        "RemoteWallClockTime": 1,
-        "MemoryUsage": 1000 * 1000,
-        "DiskUsage_RAW": 1024,
-    },
+    resource_name_mapping=RESOURCE_NAME_MAPPING,
+    used_resource_name_mapping=USED_RESOURCE_NAME_MAPPING,
+    unit_conversion_mapping=UNIT_CONVERSION_MAPPING,
+    chunk_size: Optional[int] = None,
 ):
+    """
+    Read jobs from a JSON or CSV export of htcondor
+
+    :param iterable: the export, its type is given by the extension of its name
+    :param chunk_size: convert this many rows of a CSV export at once via
+                       :py:mod:`numpy`, see :py:func:`htcondor_csv_job_reader`
+    """
     input_file_type = iterable.name.split(".")[-1].lower()
-    if input_file_type == "json":
-        htcondor_reader = json.load(iterable)
-    elif input_file_type == "csv":
-        htcondor_reader = csv.DictReader(iterable, delimiter=" ", quotechar="'")
+    if input_file_type == "csv":
+        yield from htcondor_csv_job_reader(
+            iterable,
+            resource_name_mapping=resource_name_mapping,
+            used_resource_name_mapping=used_resource_name_mapping,
+            unit_conversion_mapping=unit_conversion_mapping,
+            chunk_size=chunk_size,
+        )
+        return
+    elif input_file_type == "json":
+        # entries are parsed one at a time, the export may not fit in memory
+        htcondor_reader = json_array_reader(iterable)
     else:
         logging.getLogger("implementation").error(
             "Invalid input file %s. Job input file can not be read." % iterable.name
         )
+        return
     for entry in htcondor_reader:
         if float(entry[used_resource_name_mapping["walltime"]]) <= 0:
             logging.getLogger("implementation").warning(
@@ -71,22 +102,300 @@ def htcondor_job_reader(
             )
 
         try:
-            resources["inputfiles"] = deepcopy(entry["Inputfiles"])
-            used_resources["inputfiles"] = deepcopy(entry["Inputfiles"])
-            for filename, filespecs in entry["Inputfiles"].items():
-                if "usedsize" in filespecs:
-                    del resources["inputfiles"][filename]["usedsize"]
-                if "filesize" in filespecs:
-                    if "usedsize" not in filespecs:
-                        used_resources["inputfiles"][filename]["usedsize"] = filespecs[
-                            "filesize"
-                        ]
-                    del used_resources["inputfiles"][filename]["filesize"]
-
+            inputfiles = entry["Inputfiles"]
         except KeyError:
             pass
+        else:
+            (
+                resources["inputfiles"],
+                used_resources["inputfiles"],
+            ) = _split_inputfiles(inputfiles)
         yield Job(
             resources=resources,
             used_resources=used_resources,
             queue_date=float(entry[used_resource_name_mapping["queuetime"]]),
         )
+
+
+def _split_inputfiles(inputfiles: dict):
+    """
+    Split the `inputfiles` of an entry into the requested inputfiles, without
+    their `usedsize`, and the used inputfiles, with their `filesize` as
+    `usedsize` unless the latter is given
+    """
+    requested, used = {}, {}
+    for filename, filespecs in inputfiles.items():
+        requested_specs = dict(filespecs)
+        used_specs = dict(filespecs)
+        if "usedsize" in filespecs:
+            del requested_specs["usedsize"]
+        if "filesize" in filespecs:
+            if "usedsize" not in filespecs:
+                used_specs["usedsize"] = filespecs["filesize"]
+            del used_specs["filesize"]
+        requested[filename] = requested_specs
+        used[filename] = used_specs
+    return requested, used
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER_PART = frozenset("0123456789.eE+-")
+
+
+def json_array_reader(stream, buffer_size: int = 64 * 1024) -> Iterator:
+    """
+    Read the entries of a JSON array from `stream` one at a time
+
+    The stream is read in chunks of `buffer_size` characters, so only the
+    current chunk and entry are kept in memory instead of the whole array.
+
+    :param stream: file-like object providing the array via `read`
+    :param buffer_size: number of characters to read at once
+    :raises json.JSONDecodeError: if the stream does not contain an array
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, complete = "", 0, False
+
+    def skip_whitespace():
+        nonlocal position
+        position = _WHITESPACE.match(buffer, position).end()
+        while position == len(buffer) and not complete:
+            read()
+            position = _WHITESPACE.match(buffer, position).end()
+
+    def read():
+        nonlocal buffer, position, complete
+        # read at least as much as is buffered, large entries take few reads
+        chunk = stream.read(max(buffer_size, len(buffer) - position))
+        complete = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+    def expect(delimiters: str) -> str:
+        skip_whitespace()
+        delimiter = buffer[position] if position < len(buffer) else ""
+        if not delimiter or delimiter not in delimiters:
+            raise json.JSONDecodeError(
+                "Expecting one of %r" % delimiters, buffer, position
+            )
+        return delimiter
+
+    expect("[")
+    position += 1
+    skip_whitespace()
+    if buffer.startswith("]", position):
+        return
+    while True:
+        try:
+            entry, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if complete:
+                raise
+            read()
+            continue
+        # a number at the end of the buffer may continue, e.g. `1.` or `1.5e`
+        if not complete and (end == len(buffer) or buffer[end] in _NUMBER_PART):
+            read()
+            continue
+        position = end
+        yield entry
+        if expect(",]") == "]":
+            return
+        position += 1
+        skip_whitespace()
+
+
+def htcondor_csv_job_reader(
+    iterable,
+    resource_name_mapping=RESOURCE_NAME_MAPPING,
+    used_resource_name_mapping=USED_RESOURCE_NAME_MAPPING,
+    unit_conversion_mapping=UNIT_CONVERSION_MAPPING,
+    chunk_size: Optional[int] = None,
+):
+    """
+    Read jobs from a CSV export of htcondor
+
+    The jobs are the same as read by :py:func:`htcondor_job_reader`, but rows
+    are not turned into a :py:class:`dict` each: the columns and unit
+    conversion factors are looked up once from the header, and every row is
+    converted by position.
+
+    :param iterable: lines of the export, including its header
+    :param chunk_size: convert this many rows at once via :py:mod:`numpy`
+                       instead of row by row, chunks that cannot be converted
+                       exactly are converted row by row anyway
+    """
+    assert chunk_size is None or numpy is not None, "chunk_size requires numpy"
+    reader = csv.reader(iterable, delimiter=" ", quotechar="'")
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = _CSVColumns(
+        header,
+        resource_name_mapping,
+        used_resource_name_mapping,
+        unit_conversion_mapping,
+    )
+    # blank lines are not rows, as for csv.DictReader
+    rows = (row for row in reader if row)
+    if chunk_size is None:
+        for row in rows:
+            job = columns.job(row)
+            if job is not None:
+                yield job
+        return
+    chunk = list(islice(rows, chunk_size))
+    while chunk:
+        yield from columns.chunk_jobs(chunk)
+        chunk = list(islice(rows, chunk_size))
+
+
+class _CSVColumns(object):
+    """
+    Positions and unit conversion factors of the columns of a CSV export,
+    used to convert its rows to jobs
+    """
+
+    def __init__(
+        self,
+        header: List[str],
+        resource_name_mapping,
+        used_resource_name_mapping,
+        unit_conversion_mapping,
+    ):
+        self.header = header
+        position = {name: index for index, name in enumerate(header)}
+        self.requested = [
+            (key, position[name], unit_conversion_mapping.get(name, 1))
+            for key, name in resource_name_mapping.items()
+        ]
+        self.used = [
+            (
+                key,
+                position[used_resource_name_mapping[key]],
+                unit_conversion_mapping.get(used_resource_name_mapping[key], 1),
+            )
+            for key in ["memory", "walltime", "disk"]
+        ]
+        self.walltime = position[used_resource_name_mapping["walltime"]]
+        self.system_cpu = position["RemoteSysCpu"]
+        self.user_cpu = position["RemoteUserCpu"]
+        self.cores_factor = unit_conversion_mapping.get(
+            resource_name_mapping["cores"], 1
+        )
+        self.queue_date = position[used_resource_name_mapping["queuetime"]]
+
+    def skip(self, row: List[str]):
+        """Report that the job of `row` is removed from the import"""
+        entry = {
+            name: row[index] if index < len(row) else None
+            for index, name in enumerate(self.header)
+        }
+        logging.getLogger("implementation").warning(
+            "removed job from htcondor import (%s)", entry
+        )
+
+    def job(self, row: List[str]) -> Optional[Job]:
+        """Convert `row` to a job, or skip it if it has no walltime"""
+        walltime = float(row[self.walltime])
+        if walltime <= 0:
+            self.skip(row)
+            return None
+        resources = {}
+        for key, index, factor in self.requested:
+            try:
+                resources[key] = int(float(row[index]) * factor)
+            except ValueError:
+                pass
+        used_resources = {
+            "cores": (
+                (float(row[self.system_cpu]) + float(row[self.user_cpu])) / walltime
+            )
+            * self.cores_factor
+        }
+        for key, index, factor in self.used:
+            used_resources[key] = int(float(row[index]) * factor)
+        return Job(
+            resources=resources,
+            used_resources=used_resources,
+            queue_date=float(row[self.queue_date]),
+        )
+
+    def chunk_jobs(self, rows: List[List[str]]):
+        """Convert all `rows` to jobs, skipping those without walltime"""
+        try:
+            converted = self._convert(rows)
+        except (ValueError, IndexError, OverflowError):
+            converted = None
+        if converted is None:
+            for row in rows:
+                job = self.job(row)
+                if job is not None:
+                    yield job
+            return
+        valid, requested, used_cores, used, queue_date = converted
+        for index, row in enumerate(rows):
+            if not valid[index]:
+                self.skip(row)
+                continue
+            resources = {key: column[index] for key, column in requested}
+            used_resources = {"cores": used_cores[index]}
+            for key, column in used:
+                used_resources[key] = column[index]
+            yield Job(
+                resources=resources,
+                used_resources=used_resources,
+                queue_date=queue_date[index],
+            )
+
+    def _convert(self, rows: List[List[str]]):
+        """
+        Convert the columns of `rows` via :py:mod:`numpy`, or return
+        :py:data:`None` if this would not give the same jobs as :py:meth:`job`
+        """
+
+        def column(index):
+            return numpy.array([row[index] for row in rows], dtype=float)
+
+        def integers(values):
+            # int() truncates like astype, but fails for non-finite values
+            if not (numpy.abs(values) < 2**63).all():
+                return None
+            return values.astype(numpy.int64).tolist()
+
+        walltime = column(self.walltime)
+        # same as the skip condition of job, which keeps NaN
+        valid = ~(walltime <= 0)
+        requested = []
+        for key, index, factor in self.requested:
+            values = integers(column(index)[valid] * factor)
+            if values is None:
+                return None
+            requested.append((key, _expand(values, valid)))
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            used_cores = (
+                (column(self.system_cpu) + column(self.user_cpu)) / walltime
+            ) * self.cores_factor
+        used = []
+        for key, index, factor in self.used:
+            values = integers(column(index)[valid] * factor)
+            if values is None:
+                return None
+            used.append((key, _expand(values, valid)))
+        queue_date = column(self.queue_date)
+        return (
+            valid.tolist(),
+            requested,
+            used_cores.tolist(),
+            used,
+            queue_date.tolist(),
+        )
+
+
+def _expand(values: list, valid) -> list:
+    """Spread `values` of the `valid` rows over all rows"""
+    if len(values) == len(valid):
+        return values
+    expanded = [None] * len(valid)
+    for value, row in enumerate(numpy.flatnonzero(valid).tolist()):
+        expanded[row] = values[value]
+    return expanded
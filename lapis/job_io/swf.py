@@ -3,7 +3,8 @@ Import of jobs from the parallel workload archive.
 Current implementation is based on version 2.2 of the
 [Standard Workload Format](http://www.cs.huji.ac.il/labs/parallel/workload/swf.html).
 """
-import csv
+import mmap
+import os
 
 from lapis.job import Job
 
@@ -25,7 +26,19 @@ def swf_job_reader(
         "Used Memory": 1024,
         "Requested Memory": 1024,
     },
+    memory_map: bool = False,
 ):
+    """
+    Read jobs from a workload in the Standard Workload Format
+
+    Negative requested cores, walltime and memory, which mark values that are
+    not given, are read as `0`. Memory is given per processor and is scaled
+    by the number of requested or allocated processors.
+
+    :param iterable: lines of the workload
+    :param memory_map: read the file of `iterable` via :py:mod:`mmap` from
+                       its start instead of iterating its lines
+    """
     header = {
         "Job Number": 0,
         "Submit Time": 1,
@@ -46,48 +59,78 @@ def swf_job_reader(
         "Preceding Job Number": 16,
         "Think Time from Preceding Job": 17,  # s
     }
-    reader = csv.reader(
-        (line for line in iterable if line[0] != ";"),
-        delimiter=" ",
-        skipinitialspace=True,
+    names = [
+        resource_name_mapping["cores"],
+        resource_name_mapping["walltime"],
+        resource_name_mapping["memory"],
+        used_resource_name_mapping["cores"],
+        used_resource_name_mapping["walltime"],
+        used_resource_name_mapping["memory"],
+        used_resource_name_mapping["queuetime"],
+    ]
+    # each column is converted once per row, the corrected requested values
+    # are also seen by used values read from the same column
+    columns = list(dict.fromkeys(header[name] for name in names))
+    (
+        requested_cores,
+        requested_walltime,
+        requested_memory,
+        used_cores,
+        used_walltime,
+        used_memory,
+        queue_date,
+    ) = (columns.index(header[name]) for name in names)
+    corrected = (requested_cores, requested_walltime, requested_memory)
+    requested_factor, used_factor = (
+        {
+            key: unit_conversion_mapping.get(mapping[key], 1)
+            for key in ("cores", "walltime", "memory")
+        }
+        for mapping in (resource_name_mapping, used_resource_name_mapping)
     )
-    for row in reader:
+    if memory_map:
+        lines, comment = _mapped_lines(iterable), b";"
+    else:
+        lines, comment = iterable, ";"
+    for line in lines:
+        if line[:1] == comment:
+            continue
+        row = line.split()
+        values = [float(row[column]) for column in columns]
+        # correct request parameters
+        for index in corrected:
+            if values[index] < 0:
+                values[index] = 0.0
         resources = {}
         used_resources = {}
-        # correct request parameters
-        for key in ["cores", "walltime", "memory"]:
-            if float(row[header[resource_name_mapping[key]]]) < 0:
-                row[header[resource_name_mapping[key]]] = 0
-        for key in ["cores", "walltime"]:
-            value = float(row[header[resource_name_mapping[key]]])
-            used_value = float(row[header[used_resource_name_mapping[key]]])
+        for key, value, used_value in (
+            ("cores", values[requested_cores], values[used_cores]),
+            ("walltime", values[requested_walltime], values[used_walltime]),
+        ):
             if value >= 0:
-                resources[key] = value * unit_conversion_mapping.get(
-                    resource_name_mapping[key], 1
-                )
+                resources[key] = value * requested_factor[key]
             if used_value >= 0:
-                used_resources[key] = used_value * unit_conversion_mapping.get(
-                    used_resource_name_mapping[key], 1
-                )
+                used_resources[key] = used_value * used_factor[key]
         # handle memory
-        key = "memory"
-        resources[key] = int(
-            (
-                float(row[header[resource_name_mapping[key]]])
-                * float(row[header[resource_name_mapping["cores"]]])
-            )
-            * unit_conversion_mapping.get(resource_name_mapping[key], 1)
+        resources["memory"] = int(
+            (values[requested_memory] * values[requested_cores])
+            * requested_factor["memory"]
         )
-        used_resources[key] = int(
-            (
-                float(row[header[used_resource_name_mapping[key]]])
-                * float(row[header[used_resource_name_mapping["cores"]]])
-            )
-            * unit_conversion_mapping.get(used_resource_name_mapping[key], 1)
+        used_resources["memory"] = int(
+            (values[used_memory] * values[used_cores]) * used_factor["memory"]
         )
+        name = row[header["Job Number"]]
         yield Job(
             resources=resources,
             used_resources=used_resources,
-            queue_date=float(row[header[used_resource_name_mapping["queuetime"]]]),
-            name=row[header["Job Number"]],
+            queue_date=values[queue_date],
+            name=name if not memory_map else name.decode(),
         )
+
+
+def _mapped_lines(stream):
+    """Lines of the file of `stream` as :py:class:`bytes`, read via mmap"""
+    if os.fstat(stream.fileno()).st_size == 0:
+        return
+    with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield from iter(mapped.readline, b"")
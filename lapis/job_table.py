@@ -0,0 +1,211 @@
+import json
+import os
+from array import array
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from lapis.job import Job
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+nan = float("nan")
+
+
+class JobTable(object):
+    """
+    Columnar storage of the jobs of a trace
+
+    Every job is a row of the table. The queue date, the walltime and the
+    requested walltime are stored in one array each, requested and used
+    resources in one array per resource type. Resource types a job does not
+    specify, and a requested walltime that is not given, are stored as `NaN`.
+    Names and inputfiles are only stored for the jobs that have them. Values
+    of columns that only ever held integers are restored as :py:class:`int`,
+    so that jobs are the same as those stored.
+
+    :py:class:`~lapis.job.Job` objects are only created on demand, when
+    iterating the table or via :py:meth:`job`. The table does not keep them,
+    so each job is released once the simulation is done with it.
+
+    Tables can be stored via :py:meth:`save` and memory-mapped again via
+    :py:meth:`load` if :py:mod:`numpy` is installed.
+    """
+
+    def __init__(self):
+        self.queue_date = array("d")
+        self.walltime = array("d")
+        self.requested_walltime = array("d")
+        #: requested resources by resource type
+        self.resources: Dict[str, array] = {}
+        #: used resources by resource type
+        self.used_resources: Dict[str, array] = {}
+        self._names: Dict[int, str] = {}
+        self._inputfiles: Dict[int, Tuple[Optional[Dict], Optional[Dict]]] = {}
+        # columns holding values that are not integers, as (table, column)
+        self._floats: Set[Tuple[str, str]] = set()
+
+    def __len__(self):
+        return len(self.walltime)
+
+    def __iter__(self) -> Iterator[Job]:
+        for row in range(len(self)):
+            yield self.job(row)
+
+    def append(self, job: Job) -> int:
+        """Add a row for `job` and return the row"""
+        row = len(self)
+        self._store("resources", self.resources, job.resources, row)
+        self._store("used_resources", self.used_resources, job.used_resources, row)
+        self._append("queue_date", self.queue_date, job.queue_date)
+        self._append("walltime", self.walltime, job.walltime)
+        if job.requested_walltime is None:
+            self.requested_walltime.append(nan)
+        else:
+            self._append(
+                "requested_walltime", self.requested_walltime, job.requested_walltime
+            )
+        if job._name is not None:
+            self._names[row] = job._name
+        if job.requested_inputfiles is not None or job.used_inputfiles is not None:
+            self._inputfiles[row] = job.requested_inputfiles, job.used_inputfiles
+        return row
+
+    def extend(self, jobs: Iterable[Job]):
+        """Add a row for each of the `jobs`, e.g. as provided by a job reader"""
+        for job in jobs:
+            self.append(job)
+
+    def job(self, row: int) -> Job:
+        """Create the job stored in `row`"""
+        resources = self._load("resources", self.resources, row)
+        used_resources = self._load("used_resources", self.used_resources, row)
+        used_resources["walltime"] = self._value("walltime", self.walltime[row])
+        requested_walltime = self.requested_walltime[row]
+        if requested_walltime == requested_walltime:
+            resources["walltime"] = self._value(
+                "requested_walltime", requested_walltime
+            )
+        try:
+            requested_inputfiles, used_inputfiles = self._inputfiles[row]
+        except KeyError:
+            pass
+        else:
+            if requested_inputfiles is not None:
+                resources["inputfiles"] = requested_inputfiles
+            if used_inputfiles is not None:
+                used_resources["inputfiles"] = used_inputfiles
+        return Job(
+            resources=resources,
+            used_resources=used_resources,
+            queue_date=self._value("queue_date", self.queue_date[row]),
+            name=self._names.get(row),
+        )
+
+    def save(self, directory: str):
+        """
+        Store the table in the existing `directory`
+
+        Every column is stored as a ``.npy`` file. The resource types, names,
+        inputfiles and the columns holding values other than integers are
+        stored in a ``table.json`` file.
+        """
+        assert numpy is not None, "storing a JobTable requires numpy"
+        for name, column in self._columns():
+            numpy.save(
+                os.path.join(directory, name + ".npy"),
+                numpy.asarray(column, dtype=numpy.float64),
+            )
+        with open(os.path.join(directory, "table.json"), "w") as sidecar:
+            json.dump(
+                {
+                    "jobs": len(self),
+                    "resources": list(self.resources),
+                    "used_resources": list(self.used_resources),
+                    "floats": sorted(self._floats),
+                    "names": list(self._names.items()),
+                    "inputfiles": [
+                        [row, *inputfiles]
+                        for row, inputfiles in self._inputfiles.items()
+                    ],
+                },
+                sidecar,
+            )
+
+    @classmethod
+    def load(cls, directory: str) -> "JobTable":
+        """
+        Load a table stored via :py:meth:`save` from `directory`
+
+        The columns are memory-mapped read-only instead of read, so loading
+        takes about the same time for any number of jobs. Jobs cannot be added
+        to the loaded table.
+        """
+        assert numpy is not None, "loading a JobTable requires numpy"
+        with open(os.path.join(directory, "table.json")) as sidecar:
+            content = json.load(sidecar)
+        # empty files cannot be mapped
+        mmap_mode = "r" if content["jobs"] else None
+
+        def column(name: str) -> memoryview:
+            path = os.path.join(directory, name + ".npy")
+            return memoryview(numpy.load(path, mmap_mode=mmap_mode))
+
+        table = cls()
+        table.queue_date = column("queue_date")
+        table.walltime = column("walltime")
+        table.requested_walltime = column("requested_walltime")
+        for name in ("resources", "used_resources"):
+            setattr(
+                table,
+                name,
+                {
+                    resource_type: column("%s.%d" % (name, index))
+                    for index, resource_type in enumerate(content[name])
+                },
+            )
+        table._floats = {(kind, name) for kind, name in content["floats"]}
+        table._names = dict(content["names"])
+        table._inputfiles = {
+            row: (requested_inputfiles, used_inputfiles)
+            for row, requested_inputfiles, used_inputfiles in content["inputfiles"]
+        }
+        return table
+
+    def _columns(self) -> Iterator[Tuple[str, array]]:
+        """Names and columns of the table as stored by :py:meth:`save`"""
+        yield "queue_date", self.queue_date
+        yield "walltime", self.walltime
+        yield "requested_walltime", self.requested_walltime
+        for name in ("resources", "used_resources"):
+            for index, column in enumerate(getattr(self, name).values()):
+                yield "%s.%d" % (name, index), column
+
+    def _append(self, name: str, column: array, value: float, table: str = ""):
+        column.append(value)
+        if type(value) is not int:
+            self._floats.add((table, name))
+
+    def _value(self, name: str, value: float, table: str = "") -> float:
+        return value if (table, name) in self._floats else int(value)
+
+    def _store(self, name: str, table: Dict[str, array], resources: Dict, row: int):
+        for resource_type in resources:
+            if resource_type not in table:
+                table[resource_type] = array("d", [nan]) * row
+        for resource_type, column in table.items():
+            try:
+                amount = resources[resource_type]
+            except KeyError:
+                column.append(nan)
+            else:
+                self._append(resource_type, column, amount, table=name)
+
+    def _load(self, name: str, table: Dict[str, array], row: int) -> Dict:
+        resources = {}
+        for resource_type, column in table.items():
+            amount = column[row]
+            if amount == amount:
+                resources[resource_type] = self._value(resource_type, amount, name)
+        return resources
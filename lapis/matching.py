@@ -0,0 +1,419 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from heapq import merge
+from itertools import count
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class DroneCluster(object):
+    """
+    Drones sharing the same free resources. The first drone of the cluster
+    represents the cluster when matching jobs.
+
+    Drones are kept in insertion order and can be added and removed in
+    constant time.
+
+    :param drones: initial drones of the cluster
+    :param key: canonical free resources of the drones in the cluster
+    """
+
+    __slots__ = ("order", "key", "_drones")
+
+    def __init__(self, drones: Iterable = (), key: Tuple = None):
+        self.order = None
+        self.key = key
+        self._drones = OrderedDict.fromkeys(drones)
+
+    def __len__(self):
+        return len(self._drones)
+
+    def __iter__(self):
+        return iter(self._drones)
+
+    def __contains__(self, drone):
+        return drone in self._drones
+
+    @property
+    def representative(self):
+        return next(iter(self._drones))
+
+    def append(self, drone):
+        self._drones[drone] = None
+
+    def remove(self, drone):
+        del self._drones[drone]
+
+
+class CostCache(object):
+    """
+    Least recently used cache of the cost of putting jobs on drone clusters.
+
+    Costs are keyed by the shape of the job and the shape of the cluster, i.e.
+    its free resources and the resource types of its representative. Since
+    the key only depends on these values, cached costs stay valid when drones
+    move between clusters or clusters are created and removed.
+
+    :param cost: function calculating the cost from the job shape, the free
+                 resources of the cluster and the pool resource types
+    :param maxsize: maximum number of costs to keep
+    """
+
+    def __init__(self, cost: Callable[[Tuple, Tuple, Tuple], float], maxsize=4096):
+        self._cost = lru_cache(maxsize=maxsize)(cost)
+
+    def __call__(
+        self, job_shape: Tuple, cluster_shape: Tuple, resource_types: Tuple
+    ) -> float:
+        return self._cost(job_shape, cluster_shape, resource_types)
+
+    @property
+    def hits(self) -> int:
+        return self._cost.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        return self._cost.cache_info().misses
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups answered from the cache"""
+        info = self._cost.cache_info()
+        lookups = info.hits + info.misses
+        return info.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self._cost.cache_clear()
+
+
+class ClusterIndex(object):
+    """
+    Index of drone clusters by the pool resources of their representative.
+
+    Clusters are grouped by the pool resources their representative provides
+    in total, of which there are usually only a few different ones. Looking up
+    the candidates for a job therefore only visits clusters that could hold the
+    job at all, while the free resources deciding whether it fits right now are
+    still checked by the scheduler. Jobs starting and finishing on a drone do
+    not change its pool resources, only a new representative with different
+    pool resources moves a cluster to another group. Candidates are returned in
+    the order the clusters were created, so that selecting from them gives the
+    same result as walking all clusters.
+
+    Adding and removing clusters takes constant time. The scheduler must call
+    :py:meth:`update` whenever the representative of a cluster changes, which
+    also takes constant time unless the new representative has different pool
+    resources.
+    """
+
+    def __init__(self):
+        self._orders = count()
+        self._clusters: Dict[int, DroneCluster] = {}
+        # clusters by the pool resources of their representative
+        self._pools: Dict[int, Tuple] = {}
+        self._groups: Dict[Tuple, Dict[int, DroneCluster]] = {}
+
+    def __len__(self):
+        return len(self._clusters)
+
+    def __iter__(self):
+        return iter(self._clusters.values())
+
+    def add(self, cluster: DroneCluster):
+        cluster.order = next(self._orders)
+        self._clusters[cluster.order] = cluster
+        self._insert(cluster)
+
+    def update(self, cluster: DroneCluster):
+        if _pool(cluster) != self._pools[cluster.order]:
+            self._discard(cluster)
+            self._insert(cluster)
+
+    def remove(self, cluster: DroneCluster):
+        self._discard(cluster)
+        del self._clusters[cluster.order]
+
+    def candidates(self, resources: Dict) -> List[DroneCluster]:
+        """
+        Clusters whose representative provides at least the given `resources`
+        in total, ordered by their creation. The free resources of the
+        clusters are not checked, so candidates may be unable to hold the
+        requested resources right now.
+
+        :param resources: the requested resources
+        :return: list of matching clusters
+        """
+        groups = [
+            group
+            for group in self._groups.values()
+            if all(
+                requested <= 0 or group.provided.get(resource_type, 0) >= requested
+                for resource_type, requested in resources.items()
+            )
+        ]
+        if len(groups) == 1:
+            return list(groups[0].values())
+        return [cluster for _, cluster in merge(*(group.items() for group in groups))]
+
+    def _insert(self, cluster: DroneCluster):
+        pool = self._pools[cluster.order] = _pool(cluster)
+        try:
+            group = self._groups[pool]
+        except KeyError:
+            group = self._groups[pool] = _Group(pool)
+        group[cluster.order] = cluster
+        if cluster.order < group.newest:
+            # only clusters changing their pool resources are inserted late
+            clusters = sorted(group.items())
+            group.clear()
+            group.update(clusters)
+        group.newest = max(group.newest, cluster.order)
+
+    def _discard(self, cluster: DroneCluster):
+        pool = self._pools.pop(cluster.order)
+        group = self._groups[pool]
+        del group[cluster.order]
+        if not group:
+            del self._groups[pool]
+
+
+class _Group(dict):
+    """Clusters with the same pool resources by their creation order"""
+
+    __slots__ = ("provided", "newest")
+
+    def __init__(self, pool: Tuple):
+        super(_Group, self).__init__()
+        self.provided = dict(pool)
+        self.newest = -1
+
+
+def _pool(cluster: DroneCluster) -> Tuple:
+    return tuple(sorted(cluster.representative.pool_resources.items()))
+
+
+class VectorizedClusterIndex(ClusterIndex):
+    """
+    Cluster index that additionally keeps the free resources of all
+    representatives in a two-dimensional :py:mod:`numpy` array to score all
+    clusters for a job at once. The free resources are given by the cluster
+    key or, for clusters without a key, are those a representative had when
+    its cluster was added or updated.
+
+    Each row of the array belongs to a cluster and each column to a resource
+    type. Rows of removed clusters are reused for new clusters, the order of
+    clusters is kept separately to break ties the same way as the scheduler.
+    Strategies calculate their costs from the free resources in :py:attr:`free`,
+    the resource types in :py:attr:`columns`, whether the representatives
+    provide a resource type in :py:attr:`provided` and the number of their
+    resource types in :py:attr:`pool_size`.
+
+    Cluster keys are given as `(type, amount)` pairs or, with a `schema`, as
+    the amounts in the order of the schema.
+
+    .. Note::
+
+        This index requires :py:mod:`numpy` to be installed.
+    """
+
+    def __init__(self, capacity: int = 64, schema=None):
+        assert numpy is not None, "vectorized matching requires numpy"
+        super(VectorizedClusterIndex, self).__init__()
+        self._schema = schema
+        self.columns: Dict[str, int] = {}
+        self._rows: Dict[int, int] = {}
+        self._free_rows: List[int] = []
+        self.free = numpy.zeros((capacity, 0))
+        self.provided = numpy.zeros((capacity, 0), dtype=bool)
+        self.pool_size = numpy.zeros(capacity)
+        # rows that are not in use are ordered last and never selected
+        self._order = numpy.full(capacity, numpy.inf)
+
+    def select(self, resources: Dict, strategy) -> Optional[DroneCluster]:
+        """
+        Select the cluster to put a job requesting `resources` on. The first
+        cluster with a cost of at most the threshold of the `strategy` is
+        selected directly, otherwise the first cluster with minimal cost is
+        selected.
+
+        :param resources: the requested resources
+        :param strategy: the :py:class:`~lapis.strategy.MatchingStrategy`
+                         calculating the cost per row
+        :return: the cluster or `None` if no cluster can hold the job
+        """
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            costs = strategy.costs(self, resources)
+        costs[self._order == numpy.inf] = numpy.inf
+        matching = costs <= strategy.threshold
+        if not matching.any():
+            minimum = costs.min()
+            if minimum == numpy.inf:
+                return None
+            matching = costs == minimum
+        row = numpy.argmin(numpy.where(matching, self._order, numpy.inf))
+        return self._clusters[int(self._order[row])]
+
+    def update(self, cluster: DroneCluster):
+        super(VectorizedClusterIndex, self).update(cluster)
+        self._write(cluster)
+
+    def _insert(self, cluster: DroneCluster):
+        super(VectorizedClusterIndex, self)._insert(cluster)
+        try:
+            row = self._free_rows.pop()
+        except IndexError:
+            row = len(self._rows)
+            if row == len(self._order):
+                self._grow()
+        self._rows[cluster.order] = row
+        self._order[row] = cluster.order
+        self._write(cluster)
+
+    def _write(self, cluster: DroneCluster):
+        """Write the resources of `cluster` to its row"""
+        row = self._rows[cluster.order]
+        representative = cluster.representative
+        if cluster.key is None:
+            free = representative.theoretical_available_resources
+        elif self._schema is not None:
+            free = dict(self._schema.pairs(cluster.key))
+        else:
+            free = dict(cluster.key)
+        for resource_type in free:
+            self._column(resource_type)
+        self.free[row] = 0
+        self.provided[row] = False
+        for resource_type, available in free.items():
+            self.free[row, self.columns[resource_type]] = available
+        for resource_type in representative.pool_resources:
+            self.provided[row, self._column(resource_type)] = True
+        self.pool_size[row] = len(representative.pool_resources)
+
+    def _discard(self, cluster: DroneCluster):
+        super(VectorizedClusterIndex, self)._discard(cluster)
+        row = self._rows.pop(cluster.order)
+        self._order[row] = numpy.inf
+        self._free_rows.append(row)
+
+    def _column(self, resource_type: str) -> int:
+        try:
+            return self.columns[resource_type]
+        except KeyError:
+            column = self.columns[resource_type] = len(self.columns)
+            rows = len(self._order)
+            self.free = numpy.hstack((self.free, numpy.zeros((rows, 1))))
+            self.provided = numpy.hstack(
+                (self.provided, numpy.zeros((rows, 1), dtype=bool))
+            )
+            return column
+
+    def _grow(self):
+        rows = len(self._order)
+        self.free = numpy.vstack((self.free, numpy.zeros_like(self.free)))
+        self.provided = numpy.vstack((self.provided, numpy.zeros_like(self.provided)))
+        self.pool_size = numpy.concatenate((self.pool_size, numpy.zeros(rows)))
+        self._order = numpy.concatenate((self._order, numpy.full(rows, numpy.inf)))
+
+
+class Timeline(object):
+    """
+    Free resources of a drone over time, used to plan reservations.
+
+    The free resources are a step function, starting with the resources that
+    are free at `start`. Running jobs release their resources at the time they
+    are expected to end, reservations take resources from the time they start
+    until the time they end. The times at which the free resources change are
+    kept sorted, so that steps are found by bisection.
+
+    The steps for the `releases` are created in one pass over them. Since
+    reservations start at the beginning of the timeline or at a time found by
+    :py:meth:`earliest`, reserving resources adds at most one step.
+
+    :param start: the time the timeline starts
+    :param resources: the resources that are free at `start`
+    :param releases: pairs of the time and the resources released at that time
+    """
+
+    __slots__ = ("_times", "_free")
+
+    def __init__(self, start: float, resources: Dict, releases: Iterable[Tuple] = ()):
+        self._times: List[float] = [start]
+        self._free: List[Dict] = [dict(resources)]
+        free = self._free[0]
+        for time, released in sorted(releases, key=itemgetter(0)):
+            free = dict(free)
+            for resource_type, amount in released.items():
+                free[resource_type] = free.get(resource_type, 0) + amount
+            if time > self._times[-1]:
+                self._times.append(time)
+                self._free.append(free)
+            else:
+                self._free[-1] = free
+
+    def __iter__(self):
+        """The steps of the timeline as pairs of time and free resources"""
+        for index, time in enumerate(self._times):
+            yield time, self._free[index]
+
+    def reserve(self, start: float, end: float, resources: Dict):
+        """Take `resources` from `start` until `end`"""
+        first = self._split(start)
+        last = self._split(end) if end < float("Inf") else len(self._times)
+        for step in self._free[first:last]:
+            for resource_type, amount in resources.items():
+                step[resource_type] = step.get(resource_type, 0) - amount
+
+    def fits(self, start: float, end: float, resources: Dict) -> bool:
+        """Whether `resources` are free from `start` until `end`"""
+        index = max(bisect_right(self._times, start) - 1, 0)
+        while True:
+            if not _holds(self._free[index], resources):
+                return False
+            index += 1
+            if index == len(self._times) or self._times[index] >= end:
+                return True
+
+    def earliest(
+        self, duration: float, resources: Dict, before: float = float("Inf")
+    ) -> float:
+        """
+        Earliest time at which `resources` are free for `duration`
+
+        :param before: time from which on the search is given up
+        :return: the time or `Inf` if the resources do not become free before
+                 `before`
+        """
+        start = None
+        for index, time in enumerate(self._times):
+            if start is None:
+                if time >= before:
+                    break
+                if _holds(self._free[index], resources):
+                    start = time
+            elif time >= start + duration:
+                break
+            elif not _holds(self._free[index], resources):
+                start = None
+        return start if start is not None else float("Inf")
+
+    def _split(self, time: float) -> int:
+        """Index of the step starting at `time`, adding it if needed"""
+        time = max(time, self._times[0])
+        index = bisect_left(self._times, time)
+        if index == len(self._times) or self._times[index] != time:
+            self._times.insert(index, time)
+            self._free.insert(index, dict(self._free[index - 1]))
+        return index
+
+
+def _holds(free: Dict, resources: Dict) -> bool:
+    return all(
+        free.get(resource_type, 0) >= amount
+        for resource_type, amount in resources.items()
+    )
@@ -153,9 +153,7 @@ def job_events(job: Job) -> List[Dict]:
             usage = job.used_resources.get(
                 resource_key, job.resources.get(resource_key, None)
             )
-            value = usage / job.resources.get(
-                resource_key, job.drone.pool_resources[resource_key]
-            )
+            value = usage / job.resources[resource_key]
             if value > 1:
                 result[f"exceeded_{resource_key}"] = value
                 error_logged = True
@@ -29,6 +29,10 @@ class Pool(interfaces.Pool):
         assert init <= capacity
         self.make_drone = make_drone
         self._drones = []
+        # sums of allocation and utilisation of all drones, kept up to date
+        # by the drones whenever they change
+        self._allocation = 0.0
+        self._utilisation = 0.0
         self._demand = 1
         self._level = init
         self._capacity = capacity
@@ -43,7 +47,7 @@ class Pool(interfaces.Pool):
         for _ in range(init):
             drone = self.make_drone(0)
             scope.do(drone.run())
-            self._drones.append(drone)
+            self._add_drone(drone)
 
     # TODO: the run method currently needs to be called manually
     async def run(self):
@@ -61,14 +65,14 @@ class Pool(interfaces.Pool):
                     # start a new drone
                     drone = self.make_drone(10)
                     scope.do(drone.run())
-                    self._drones.append(drone)
+                    self._add_drone(drone)
                     self._level += 1
                 if drones_required < 0:
                     for drone in self.drones:
                         if drone.jobs == 0:
                             drones_required += 1
                             self._level -= 1
-                            self._drones.remove(drone)
+                            self._remove_drone(drone)
                             scope.do(drone.shutdown())
                             if drones_required == 0:
                                 break
@@ -82,23 +86,41 @@ class Pool(interfaces.Pool):
     def drone_demand(self) -> int:
         return len(self._drones)
 
+    def _add_drone(self, drone: Drone):
+        self._drones.append(drone)
+        drone._pool = self
+        self.drone_changed(drone.allocation, drone.utilisation)
+
+    def _remove_drone(self, drone: Drone):
+        self._drones.remove(drone)
+        drone._pool = None
+        if self._drones:
+            self.drone_changed(-drone.allocation, -drone.utilisation)
+        else:
+            # do not carry over rounding errors of the running sums
+            self._allocation = self._utilisation = 0.0
+
+    def drone_changed(self, allocation: float, utilisation: float):
+        """
+        Account for a change of allocation and utilisation of a drone
+
+        :param allocation: change of allocation of the drone
+        :param utilisation: change of utilisation of the drone
+        """
+        self._allocation += allocation
+        self._utilisation += utilisation
+
     @property
     def allocation(self) -> float:
-        allocations = []
-        for drone in self._drones:
-            allocations.append(drone.allocation)
         try:
-            return sum(allocations) / len(allocations)
+            return self._allocation / len(self._drones)
         except ZeroDivisionError:
             return 1
 
     @property
     def utilisation(self) -> float:
-        utilisations = []
-        for drone in self._drones:
-            utilisations.append(drone.utilisation)
         try:
-            return sum(utilisations) / len(utilisations)
+            return self._utilisation / len(self._drones)
         except ZeroDivisionError:
             return 1
 
@@ -0,0 +1,243 @@
+from array import array
+from typing import Dict, Iterator, List, Mapping, MutableMapping, Tuple
+
+from lapis.drone import Drone
+
+
+class ResourceView(Mapping):
+    """
+    Read-only view of the resources of a single drone in a table of a
+    :py:class:`DroneRegistry`, restricted to the resource types of the drone
+    """
+
+    __slots__ = ("_table", "_row", "_keys")
+
+    def __init__(self, table: Dict[str, array], row: int, keys: Tuple[str, ...]):
+        self._table = table
+        self._row = row
+        self._keys = keys
+
+    def __getitem__(self, resource_type: str) -> float:
+        if resource_type not in self._keys:
+            raise KeyError(resource_type)
+        return self._table[resource_type][self._row]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def copy(self) -> Dict[str, float]:
+        return dict(self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ResourceRow(ResourceView, MutableMapping):
+    """Writable view of the resources of a single drone in a table"""
+
+    __slots__ = ()
+
+    def __setitem__(self, resource_type: str, value: float):
+        if resource_type not in self._keys:
+            raise KeyError(resource_type)
+        self._table[resource_type][self._row] = value
+
+    def __delitem__(self, resource_type: str):
+        raise TypeError("resource types of a drone cannot be removed")
+
+
+class DroneRegistry(object):
+    """
+    Central storage of the state of many drones in contiguous arrays
+
+    Every drone added to the registry is given an id, which is its row in all
+    columns. The pool, free and unused resources are stored in one column per
+    resource type, the number of jobs, supply, allocation and utilisation in
+    one column each. Aggregates over all drones are thus a single pass over
+    a column, for example ``sum(registry.supply)`` or, with :py:mod:`numpy`,
+    ``numpy.frombuffer(registry.supply).sum()`` without copying.
+
+    Drones that do not provide a resource type have an amount of `0` for it.
+    The rows of removed drones are cleared and reused for drones added later.
+    """
+
+    def __init__(self):
+        self._size = 0
+        self._unused_rows: List[int] = []
+        # resource types of the drones, shared by drones of the same type
+        self._shared: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        #: resource types provided by each drone
+        self.resource_types: List[Tuple[str, ...]] = []
+        #: resources of the drones by resource type
+        self.pool_resources: Dict[str, array] = {}
+        #: resources not requested by jobs by resource type
+        self.free_resources: Dict[str, array] = {}
+        #: resources not used by jobs by resource type
+        self.unused_resources: Dict[str, array] = {}
+        #: number of jobs of the drones
+        self.jobs = array("q")
+        #: supply of the drones
+        self.supply = array("d")
+        #: allocation of the drones
+        self.allocation = array("d")
+        #: utilisation of the drones
+        self.utilisation = array("d")
+
+    def __len__(self):
+        return self._size - len(self._unused_rows)
+
+    def add(self, pool_resources: Dict[str, float]) -> int:
+        """
+        Add a drone providing `pool_resources` and return its id
+
+        All its resources are free and unused, it runs no jobs and provides no
+        supply yet.
+        """
+        for resource_type in pool_resources:
+            if resource_type not in self.pool_resources:
+                for table in self._tables:
+                    table[resource_type] = array("d", bytes(8 * self._size))
+        resource_types = self.intern(tuple(pool_resources))
+        if self._unused_rows:
+            row = self._unused_rows.pop()
+            for table in self._tables:
+                for resource_type in resource_types:
+                    table[resource_type][row] = pool_resources[resource_type]
+            self.resource_types[row] = resource_types
+            self.allocation[row] = self.utilisation[row] = 1.0
+            return row
+        row = self._size
+        for table in self._tables:
+            for resource_type, column in table.items():
+                column.append(pool_resources.get(resource_type, 0))
+        self.resource_types.append(resource_types)
+        self.jobs.append(0)
+        self.supply.append(0)
+        self.allocation.append(1.0)
+        self.utilisation.append(1.0)
+        self._size += 1
+        return row
+
+    def remove(self, row: int):
+        """Remove the drone with id `row`, so that its row can be reused"""
+        for table in self._tables:
+            for resource_type in self.resource_types[row]:
+                table[resource_type][row] = 0
+        self.resource_types[row] = ()
+        self.jobs[row] = 0
+        self.supply[row] = self.allocation[row] = self.utilisation[row] = 0
+        self._unused_rows.append(row)
+
+    def intern(self, keys: Tuple[str, ...]) -> Tuple[str, ...]:
+        """Tuple equal to `keys` that is shared by all drones using it"""
+        return self._shared.setdefault(keys, keys)
+
+    @property
+    def _tables(self):
+        return self.pool_resources, self.free_resources, self.unused_resources
+
+
+class RegisteredDrone(Drone):
+    """
+    Drone storing its state in a :py:class:`DroneRegistry`
+
+    The drone only keeps its id and the references needed to run jobs. Its
+    resources, number of jobs, supply, allocation and utilisation are read
+    from and written to its row of the registry. Once the drone has been shut
+    down without running jobs, its row is given back to the registry and the
+    drone must no longer be used. As the registry stores resources by type, a
+    resource `schema` is ignored.
+
+    :param registry: the registry to store the state of the drone in
+    """
+
+    def __init__(self, *args, registry: DroneRegistry, **kwargs):
+        self._registry = registry
+        super(RegisteredDrone, self).__init__(*args, **kwargs)
+
+    def _init_resources(self, pool_resources: dict, ignore_resources: list, schema):
+        #: id of the drone in its registry
+        self.id = self._registry.add(pool_resources)
+        self._valid_resource_keys = self._registry.intern(
+            tuple(
+                resource
+                for resource, amount in pool_resources.items()
+                if amount > 0 and resource not in (ignore_resources or ())
+            )
+        )
+
+    @property
+    def pool_resources(self):
+        registry = self._registry
+        return ResourceView(
+            registry.pool_resources, self.id, registry.resource_types[self.id]
+        )
+
+    @property
+    def theoretical_available_resources(self):
+        registry = self._registry
+        return ResourceView(
+            registry.free_resources, self.id, registry.resource_types[self.id]
+        )
+
+    @property
+    def available_resources(self):
+        registry = self._registry
+        return ResourceView(
+            registry.unused_resources, self.id, registry.resource_types[self.id]
+        )
+
+    @property
+    def _free_resources(self):
+        registry = self._registry
+        return ResourceRow(
+            registry.free_resources, self.id, registry.resource_types[self.id]
+        )
+
+    @property
+    def _unused_resources(self):
+        registry = self._registry
+        return ResourceRow(
+            registry.unused_resources, self.id, registry.resource_types[self.id]
+        )
+
+    @property
+    def jobs(self) -> int:
+        return self._registry.jobs[self.id]
+
+    @jobs.setter
+    def jobs(self, value: int):
+        self._registry.jobs[self.id] = value
+
+    @property
+    def _supply(self) -> float:
+        return self._registry.supply[self.id]
+
+    @_supply.setter
+    def _supply(self, value: float):
+        self._registry.supply[self.id] = value
+
+    @property
+    def _allocation(self) -> float:
+        return self._registry.allocation[self.id]
+
+    @_allocation.setter
+    def _allocation(self, value: float):
+        self._registry.allocation[self.id] = value
+
+    @property
+    def _utilisation(self) -> float:
+        return self._registry.utilisation[self.id]
+
+    @_utilisation.setter
+    def _utilisation(self, value: float):
+        self._registry.utilisation[self.id] = value
+
+    async def shutdown(self):
+        await super(RegisteredDrone, self).shutdown()
+        # jobs that were already scheduled have started by now
+        if self.jobs == 0:
+            self._registry.remove(self.id)
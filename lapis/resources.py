@@ -0,0 +1,213 @@
+from operator import add, ge, sub
+from typing import Dict, Iterable, Iterator, List, Mapping, MutableMapping, Tuple
+
+
+class ResourceSchema(object):
+    """
+    Resource types of a simulation in a fixed order
+
+    Resources of jobs and drones are stored as :py:class:`ResourceVector` of
+    a schema, so that they are compared and accounted element by element
+    instead of by looking up the resource types. The resource types are
+    sorted, so that vectors list their resources in the same order as
+    :py:func:`sorted` does.
+
+    :param resource_types: the resource types of the simulation
+    """
+
+    __slots__ = ("types", "index", "_present")
+
+    def __init__(self, resource_types: Iterable[str]):
+        self.types: Tuple[str, ...] = tuple(sorted(set(resource_types)))
+        self.index = {
+            resource_type: index for index, resource_type in enumerate(self.types)
+        }
+        # positions and types of the resources present per bit mask
+        self._present: Dict[int, Tuple[Tuple[int, str], ...]] = {}
+
+    def __contains__(self, resource_type: str) -> bool:
+        return resource_type in self.index
+
+    def __len__(self):
+        return len(self.types)
+
+    def vector(self, resources: Mapping[str, float]) -> "ResourceVector":
+        """
+        Vector of `resources` given as a mapping
+
+        :raises KeyError: if a resource type is not part of the schema
+        """
+        amounts = [0] * len(self.types)
+        mask = 0
+        index = self.index
+        for resource_type, amount in resources.items():
+            position = index[resource_type]
+            amounts[position] = amount
+            mask |= 1 << position
+        return ResourceVector(self, amounts, mask)
+
+    def amounts(self, resources: Mapping[str, float]) -> Tuple[float, ...]:
+        """
+        Amounts of `resources` in the order of the schema, with an amount of
+        `0` for resource types not in `resources`
+        """
+        try:
+            if resources.schema is self:
+                return tuple(resources.amounts)
+        except AttributeError:
+            pass
+        return tuple(resources.get(resource_type, 0) for resource_type in self.types)
+
+    def present(self, mask: int) -> Tuple[Tuple[int, str], ...]:
+        """Positions and resource types of the resources present in `mask`"""
+        try:
+            return self._present[mask]
+        except KeyError:
+            present = self._present[mask] = tuple(
+                (position, resource_type)
+                for position, resource_type in enumerate(self.types)
+                if mask >> position & 1
+            )
+            return present
+
+    def pairs(self, amounts: Tuple[float, ...]) -> Tuple[Tuple[str, float], ...]:
+        """
+        Sorted `(type, amount)` pairs of the non-zero `amounts` of the schema,
+        the representation of resources used for keys without a schema
+        """
+        types = self.types
+        return tuple(
+            (types[position], amount)
+            for position, amount in enumerate(amounts)
+            if amount
+        )
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.types)
+
+
+class ResourceVector(MutableMapping):
+    """
+    Resources in the fixed order of a :py:class:`ResourceSchema`
+
+    The vector behaves like a :py:class:`dict` of the resource types it
+    provides. Resource types of the schema it does not provide have an amount
+    of `0` in :py:attr:`amounts` and are not part of its :py:attr:`mask`.
+    """
+
+    __slots__ = ("schema", "amounts", "mask")
+
+    def __init__(self, schema: ResourceSchema, amounts: List[float], mask: int):
+        self.schema = schema
+        #: amount per resource type of the schema
+        self.amounts = amounts
+        #: bit mask of the resource types provided
+        self.mask = mask
+
+    def __getitem__(self, resource_type: str) -> float:
+        position = self.schema.index[resource_type]
+        if not self.mask >> position & 1:
+            raise KeyError(resource_type)
+        return self.amounts[position]
+
+    def __setitem__(self, resource_type: str, amount: float):
+        position = self.schema.index[resource_type]
+        self.amounts[position] = amount
+        self.mask |= 1 << position
+
+    def __delitem__(self, resource_type: str):
+        position = self.schema.index[resource_type]
+        if not self.mask >> position & 1:
+            raise KeyError(resource_type)
+        self.amounts[position] = 0
+        self.mask &= ~(1 << position)
+
+    def __contains__(self, resource_type) -> bool:
+        position = self.schema.index.get(resource_type)
+        return position is not None and bool(self.mask >> position & 1)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(
+            [resource_type for _, resource_type in self.schema.present(self.mask)]
+        )
+
+    def __len__(self):
+        return bin(self.mask).count("1")
+
+    def get(self, resource_type: str, default=None):
+        position = self.schema.index.get(resource_type)
+        if position is None or not self.mask >> position & 1:
+            return default
+        return self.amounts[position]
+
+    def items(self) -> List[Tuple[str, float]]:
+        amounts = self.amounts
+        return [
+            (resource_type, amounts[position])
+            for position, resource_type in self.schema.present(self.mask)
+        ]
+
+    def copy(self) -> "ResourceVector":
+        return ResourceVector(self.schema, self.amounts[:], self.mask)
+
+    def compatible(self, other) -> bool:
+        """Whether `other` is a vector of the same schema"""
+        return type(other) is ResourceVector and other.schema is self.schema
+
+    def holds(self, other: "ResourceVector") -> bool:
+        """
+        Whether the vector provides all resource types of the vector `other`,
+        each with at least the same amount
+        """
+        return not other.mask & ~self.mask and all(map(ge, self.amounts, other.amounts))
+
+    def increase(self, other: "ResourceVector"):
+        """Add the amounts of the vector `other` in place"""
+        self.amounts[:] = map(add, self.amounts, other.amounts)
+
+    def decrease(self, other: "ResourceVector"):
+        """Subtract the amounts of the vector `other` in place"""
+        self.amounts[:] = map(sub, self.amounts, other.amounts)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, dict(self))
+
+
+class VectorView(Mapping):
+    """
+    Read-only view of a :py:class:`ResourceVector`
+
+    The view shares the :py:attr:`amounts` of the vector, which the vector only
+    changes in place.
+    """
+
+    __slots__ = ("schema", "amounts", "_vector")
+
+    def __init__(self, vector: ResourceVector):
+        self.schema = vector.schema
+        self.amounts = vector.amounts
+        self._vector = vector
+
+    def __getitem__(self, resource_type: str) -> float:
+        return self._vector[resource_type]
+
+    def __contains__(self, resource_type) -> bool:
+        return resource_type in self._vector
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._vector)
+
+    def __len__(self):
+        return len(self._vector)
+
+    def get(self, resource_type: str, default=None):
+        return self._vector.get(resource_type, default)
+
+    def items(self) -> List[Tuple[str, float]]:
+        return self._vector.items()
+
+    def copy(self) -> ResourceVector:
+        return self._vector.copy()
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, dict(self))
@@ -1,12 +1,212 @@
-from typing import Dict
-from usim import Scope, interval, Resources
+from itertools import count
+from operator import attrgetter, ge
+from typing import Dict, List, Optional, Set, Tuple
+from usim import Scope, interval, Resources, time
 
 from lapis.drone import Drone
+from lapis.matching import (
+    ClusterIndex,
+    CostCache,
+    DroneCluster,
+    Timeline,
+    VectorizedClusterIndex,
+)
 from lapis.monitor import sampling_required
+from lapis.resources import ResourceSchema, ResourceVector
+from lapis.strategy import GridKa, MatchingStrategy
+from lapis.utilities.condition import Modification
 
 
-class JobQueue(list):
-    pass
+def job_shape(job, schema: ResourceSchema = None) -> Tuple:
+    """
+    Shape of a job, i.e. the resources it requests. Jobs of the same shape are
+    interchangeable for matching.
+
+    The shape is given as sorted `(type, amount)` pairs or, with a `schema`,
+    as the amounts in the order of the schema.
+    """
+    if schema is not None:
+        return schema.amounts(job.resources)
+    return tuple(sorted(job.resources.items()))
+
+
+def _take(free_resources, requested):
+    """Subtract the `requested` resources from `free_resources` in place"""
+    if type(free_resources) is ResourceVector and free_resources.compatible(requested):
+        free_resources.decrease(requested)
+        return
+    for key, value in requested.items():
+        if key in free_resources:
+            free_resources[key] -= value
+
+
+def _give(free_resources, requested):
+    """Add the `requested` resources back to `free_resources` in place"""
+    if type(free_resources) is ResourceVector and free_resources.compatible(requested):
+        free_resources.increase(requested)
+        return
+    for key, value in requested.items():
+        if key in free_resources:
+            free_resources[key] += value
+
+
+def _quantize(value: float, quantum: Optional[float]) -> float:
+    return value // quantum * quantum if quantum is not None else value
+
+
+class QueuedJob(object):
+    """Entry of a :py:class:`JobQueue`, linking a job to its neighbours"""
+
+    __slots__ = ("job", "shape", "position", "queued", "previous", "next")
+
+    def __init__(self, job, position: int, shape: Tuple):
+        self.job = job
+        self.shape = shape
+        self.position = position
+        self.queued = True
+        self.previous: Optional[QueuedJob] = None
+        self.next: Optional[QueuedJob] = None
+
+
+class JobQueue(object):
+    """
+    Jobs waiting to be scheduled in order of their submission. The jobs are
+    additionally grouped by their :py:func:`job_shape` in :py:attr:`shapes`.
+
+    Jobs are kept in a doubly linked list so that appending and removing jobs
+    takes constant time. It is safe to change the queue while iterating it:
+    removed jobs are skipped and jobs appended after the iteration started are
+    not visited.
+
+    As jobs are grouped by their shape, the queue also serves as an index of
+    jobs by requested resources, see :py:meth:`next_fitting`.
+
+    The queue keeps a cursor at the job last visited via :py:meth:`resume`, so
+    that an iteration stopped early can be continued later on.
+
+    :param schema: resource schema to express job shapes in
+    """
+
+    def __init__(self, schema: ResourceSchema = None):
+        self._schema = schema
+        self.shapes: Dict[Tuple, Dict] = {}
+        self._entries: Dict = {}
+        self._head: Optional[QueuedJob] = None
+        self._tail: Optional[QueuedJob] = None
+        self._cursor: Optional[QueuedJob] = None
+        self._positions = count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def __contains__(self, job):
+        return job in self._entries
+
+    def __iter__(self):
+        if self._tail is None:
+            return
+        last_position = self._tail.position
+        entry = self._head
+        while entry is not None and entry.position <= last_position:
+            if entry.queued:
+                yield entry.job
+            # removed entries keep their successor to continue iteration
+            entry = entry.next
+
+    def resume(self):
+        """
+        Iterate the jobs starting at the cursor, wrapping around at the end of
+        the queue. Each job is visited at most once, jobs appended after the
+        iteration started are not visited.
+
+        If the iteration is stopped early, the cursor stays at the job visited
+        last, so that the next iteration starts with it. Once all jobs have
+        been visited, the cursor is reset to the start of the queue.
+        """
+        if self._tail is None:
+            return
+        last_position = self._tail.position
+        entry = self._cursor if self._cursor is not None else self._head
+        start_position = entry.position
+        while entry is not None and entry.position <= last_position:
+            if entry.queued:
+                self._cursor = entry
+                yield entry.job
+            entry = entry.next
+        entry = self._head
+        while entry is not None and entry.position < start_position:
+            if entry.queued:
+                self._cursor = entry
+                yield entry.job
+            entry = entry.next
+        self._cursor = None
+
+    def append(self, job):
+        entry = self._entries[job] = QueuedJob(
+            job, next(self._positions), job_shape(job, self._schema)
+        )
+        if self._tail is None:
+            self._head = entry
+        else:
+            self._tail.next = entry
+            entry.previous = self._tail
+        self._tail = entry
+        self.shapes.setdefault(entry.shape, {})[job] = entry
+
+    def remove(self, job):
+        try:
+            entry = self._entries.pop(job)
+        except KeyError:
+            raise ValueError("%r is not queued" % job) from None
+        entry.queued = False
+        if entry is self._cursor:
+            self._cursor = entry.next
+        if entry.previous is None:
+            self._head = entry.next
+        else:
+            entry.previous.next = entry.next
+        if entry.next is None:
+            self._tail = entry.previous
+        else:
+            entry.next.previous = entry.previous
+        jobs = self.shapes[entry.shape]
+        del jobs[job]
+        if not jobs:
+            del self.shapes[entry.shape]
+
+    def shape(self, job) -> Tuple:
+        """Shape of a queued job"""
+        return self._entries[job].shape
+
+    def next_fitting(self, resources: Dict):
+        """
+        The first queued job that requests at most the given `resources`. Only
+        the first job of each shape is considered, so the effort depends on the
+        number of shapes rather than the number of queued jobs.
+
+        :param resources: the available resources
+        :return: the job or `None` if no queued job fits
+        """
+        if self._schema is not None:
+            free = self._schema.amounts(resources)
+            fitting = (
+                jobs for shape, jobs in self.shapes.items() if all(map(ge, free, shape))
+            )
+        else:
+            fitting = (
+                jobs
+                for shape, jobs in self.shapes.items()
+                if all(resources.get(key, 0) >= value for key, value in shape)
+            )
+        first = None
+        for jobs in fitting:
+            entry = next(iter(jobs.values()))
+            if first is None or entry.position < first.position:
+                first = entry
+        return first.job if first is not None else None
 
 
 class CondorJobScheduler(object):
@@ -18,21 +218,143 @@ class CondorJobScheduler(object):
     So different instances can apparently behave very different.
 
     In my case I am going to try building a priority queue that sorts job slots
-    by increasing cost. The cost itself is calculated based on the current
-    strategy that is used at GridKa. The scheduler checks if a job either
-    exactly fits a slot or if it does fit into it several times. The cost for
-    putting a job at a given slot is given by the amount of resources that
-    might remain unallocated.
-    :return:
+    by increasing cost. By default, the cost itself is calculated based on the
+    current strategy that is used at GridKa. The scheduler checks if a job
+    either exactly fits a slot or if it does fit into it several times. The
+    cost for putting a job at a given slot is given by the amount of resources
+    that might remain unallocated. Other policies can be selected by passing a
+    different :py:class:`~lapis.strategy.MatchingStrategy` as `strategy`.
+
+    When `vectorized` is set, the cost for all drone clusters is calculated at
+    once with :py:mod:`numpy`, based on the free resources of the cluster
+    representatives when they have been clustered. This requires
+    :py:mod:`numpy` to be installed.
+
+    Drones with identical free resources are grouped into clusters, of which
+    only the first drone is considered for matching. To also group drones with
+    similar free resources, a `quantization` can be given for resource types.
+    Free resources are then rounded down to multiples of the given amount
+    before comparing them.
+
+    By default, a negotiation cycle is run every `interval` of simulated time.
+    When the scheduler is `event_driven`, a cycle is only run after jobs have
+    been submitted or finished, or drones have been registered, updated or
+    unregistered. If `aligned`, those cycles are delayed to the times a polling
+    scheduler would run its cycles, so that results stay comparable.
+
+    With `reverse_matching`, drones are refilled as soon as one of their jobs
+    finishes with the first queued jobs that fit into them, instead of waiting
+    for the next negotiation cycle. As refilling runs concurrently to the
+    negotiation cycle, the scheduler then accounts the free resources of each
+    drone itself: they are reduced when a job is assigned to the drone and
+    restored when the job finishes. Otherwise, the scheduler uses the free
+    resources reported by the drones.
+
+    The work of a negotiation cycle can be limited to `max_matches` jobs put on
+    drones and `max_evaluations` jobs matched against the drones. The next
+    cycle then continues with the job the previous cycle stopped at. A cycle is
+    skipped if no drone has the free resources for the smallest queued job
+    shape, and stops as soon as none of the queued jobs can be put on a drone.
+
+    The cost of a job shape on a cluster is cached in :py:attr:`cost_cache`,
+    keeping the `cost_cache_size` most recently used costs.
+
+    When `coalesce_updates` is set, drones reporting changed resources are
+    only marked and re-clustered once at the start of the next negotiation
+    cycle, instead of on every update. Until then, they may stay in a cluster
+    for their previous resources, so that freed resources of drones other than
+    the cluster representatives are only considered by the next cycle.
+
+    With a resource `schema`, job shapes and cluster keys are the amounts of
+    resources in the order of the schema instead of sorted `(type, amount)`
+    pairs. Jobs and drones then should carry their resources as vectors of the
+    schema, which are compared and accounted element by element. Strategies
+    still calculate costs from `(type, amount)` pairs, converted only when a
+    cost is not cached yet.
+
+    :param job_queue: queue the jobs to schedule are submitted to
+    :param strategy: strategy to select drones for jobs, defaults to
+                     :py:class:`~lapis.strategy.GridKa`
+    :param vectorized: whether to calculate the costs with :py:mod:`numpy`
+    :param event_driven: whether to only run cycles after modifications
+    :param aligned: whether event driven cycles are aligned to the interval
+    :param quantization: amount per resource type to round free resources to
+                         when clustering drones
+    :param reverse_matching: whether to refill drones as soon as they free
+                             resources
+    :param cost_cache_size: maximum number of cached costs
+    :param max_matches: maximum number of jobs put on drones per cycle
+    :param max_evaluations: maximum number of jobs matched per cycle
+    :param coalesce_updates: whether to re-cluster updated drones once per cycle
+    :param schema: :py:class:`~lapis.resources.ResourceSchema` of the resources
+                   of jobs and drones
     """
 
-    def __init__(self, job_queue):
+    def __init__(
+        self,
+        job_queue,
+        strategy: MatchingStrategy = None,
+        vectorized: bool = False,
+        event_driven: bool = False,
+        aligned: bool = True,
+        quantization: Dict[str, float] = None,
+        reverse_matching: bool = False,
+        cost_cache_size: int = 4096,
+        max_matches: int = None,
+        max_evaluations: int = None,
+        coalesce_updates: bool = False,
+        schema: ResourceSchema = None,
+    ):
         self._stream_queue = job_queue
-        self.drone_cluster = []
+        self.strategy = strategy if strategy is not None else GridKa()
+        self._vectorized = vectorized
+        self._schema = schema
+        self._cluster_index = (
+            VectorizedClusterIndex(schema=schema) if vectorized else ClusterIndex()
+        )
         self.interval = 60
-        self.job_queue = JobQueue()
+        self.job_queue = JobQueue(schema)
         self._collecting = True
         self._processing = Resources(jobs=0)
+        self._event_driven = event_driven
+        self._aligned = aligned
+        self._modified = Modification()
+        # clusters matched to job shapes, valid until the cluster changes
+        self._shape_matches: Dict[Tuple, DroneCluster] = {}
+        self._cluster_shapes: Dict[DroneCluster, Set[Tuple]] = {}
+        # job shapes that failed to match, valid until capacity grows
+        self._failed_shapes: Set[Tuple] = set()
+        self._drone_cluster: Dict[Drone, DroneCluster] = {}
+        # clusters by the free resources drones joining them must have
+        self._clusters: Dict[Tuple, List[DroneCluster]] = {}
+        self._quantization = quantization or {}
+        # quantization per resource type of the schema
+        self._quanta = (
+            tuple(quantization.get(key) for key in schema.types)
+            if schema is not None and quantization
+            else None
+        )
+        self._reverse_matching = reverse_matching
+        # resources of drones not used by the jobs assigned to them, only
+        # accounted with reverse matching
+        self._free_resources: Dict[Drone, Dict] = {}
+        self._job_drone: Dict = {}
+        # drones that freed resources, waiting to be refilled
+        self._freed: Dict[Drone, None] = {}
+        self._refill = Modification()
+        self.cost_cache = CostCache(
+            self.strategy.cost if schema is None else self._schema_cost,
+            maxsize=cost_cache_size,
+        )
+        self._max_matches = max_matches
+        self._max_evaluations = max_evaluations
+        self._coalesce_updates = coalesce_updates
+        # drones with changed resources, waiting to be re-clustered
+        self._dirty: Dict[Drone, None] = {}
+
+    @property
+    def drone_cluster(self) -> List[DroneCluster]:
+        return list(self._cluster_index)
 
     @property
     def drone_list(self):
@@ -41,66 +363,148 @@ class CondorJobScheduler(object):
                 yield drone
 
     def register_drone(self, drone: Drone):
+        if self._reverse_matching:
+            self._free_resources[drone] = drone.theoretical_available_resources.copy()
         self._add_drone(drone)
+        self._failed_shapes.clear()
+        self._modified.set()
 
     def unregister_drone(self, drone: Drone):
-        for cluster in self.drone_cluster:
+        self._modified.set()
+        self._free_resources.pop(drone, None)
+        self._remove_drone(drone)
+
+    def _update_dirty_drones(self):
+        """Re-cluster the drones whose resources changed since the last cycle"""
+        dirty, self._dirty = self._dirty, {}
+        for drone in dirty:
             try:
-                cluster.remove(drone)
-            except ValueError:
-                pass
-            else:
-                if len(cluster) == 0:
-                    self.drone_cluster.remove(cluster)
+                cluster = self._drone_cluster[drone]
+            except KeyError:
+                continue
+            if cluster.key != self._cluster_key(self._drone_resources(drone)):
+                self._remove_drone(drone)
+                self._add_drone(drone)
+                # the drone may join a cluster with more free resources
+                self._failed_shapes.clear()
+
+    def _remove_drone(self, drone: Drone):
+        self._dirty.pop(drone, None)
+        try:
+            cluster = self._drone_cluster.pop(drone)
+        except KeyError:
+            return
+        representative = cluster.representative
+        cluster.remove(drone)
+        if len(cluster) == 0:
+            self._forget_matches(cluster)
+            self._unfile(cluster)
+            self._cluster_index.remove(cluster)
+        elif drone is representative:
+            self._forget_matches(cluster)
+            key = self._cluster_key(self._drone_resources(cluster.representative))
+            if key != cluster.key:
+                # the new representative may have more free resources
+                self._failed_shapes.clear()
+                self._unfile(cluster)
+                cluster.key = key
+                self._file(cluster)
+            self._cluster_index.update(cluster)
 
     def _add_drone(self, drone: Drone, drone_resources: Dict = None):
-        minimum_distance_cluster = None
-        distance = float("Inf")
-        if len(self.drone_cluster) > 0:
-            for cluster in self.drone_cluster:
-                current_distance = 0
-                for key in {*cluster[0].pool_resources, *drone.pool_resources}:
-                    if drone_resources:
-                        current_distance += abs(
-                            cluster[0].theoretical_available_resources.get(key, 0)
-                            - drone_resources.get(key, 0)
-                        )
-                    else:
-                        current_distance += abs(
-                            cluster[0].theoretical_available_resources.get(key, 0)
-                            - drone.theoretical_available_resources.get(key, 0)
-                        )
-                if current_distance < distance:
-                    minimum_distance_cluster = cluster
-                    distance = current_distance
-            if distance < 1:
-                minimum_distance_cluster.append(drone)
-            else:
-                self.drone_cluster.append([drone])
+        if drone_resources is None:
+            drone_resources = self._drone_resources(drone)
+        try:
+            cluster = self._clusters[self._cluster_key(drone_resources)][0]
+        except KeyError:
+            # further drones join if they have the resources the drone reports,
+            # which differ from `drone_resources` until it claimed a new job
+            cluster = DroneCluster(
+                [drone], key=self._cluster_key(self._drone_resources(drone))
+            )
+            self._cluster_index.add(cluster)
+            self._file(cluster)
         else:
-            self.drone_cluster.append([drone])
+            cluster.append(drone)
+        self._drone_cluster[drone] = cluster
+
+    def _file(self, cluster: DroneCluster):
+        """Make drones with the resources of the `cluster` key join it"""
+        clusters = self._clusters.setdefault(cluster.key, [])
+        clusters.append(cluster)
+        if len(clusters) > 1 and clusters[-2].order > cluster.order:
+            # drones join the oldest cluster, as when comparing all clusters
+            clusters.sort(key=attrgetter("order"))
+
+    def _unfile(self, cluster: DroneCluster):
+        clusters = self._clusters[cluster.key]
+        clusters.remove(cluster)
+        if not clusters:
+            del self._clusters[cluster.key]
+
+    def _drone_resources(self, drone: Drone) -> Dict:
+        """Free resources of `drone` as known to the scheduler"""
+        if self._reverse_matching:
+            return self._free_resources[drone]
+        return drone.theoretical_available_resources
+
+    def _cluster_key(self, resources: Dict) -> Tuple:
+        """
+        Canonical, quantized representation of free `resources`. Resource types
+        that are not available and those that are used up are equivalent.
+        """
+        if self._schema is not None:
+            amounts = self._schema.amounts(resources)
+            if self._quanta is not None:
+                return tuple(map(_quantize, amounts, self._quanta))
+            return amounts
+        quantization = self._quantization
+        if quantization:
+            resources = {
+                key: (
+                    value // quantization[key] * quantization[key]
+                    if key in quantization
+                    else value
+                )
+                for key, value in resources.items()
+            }
+        return tuple(sorted((key, value) for key, value in resources.items() if value))
 
     def update_drone(self, drone: Drone):
-        self.unregister_drone(drone)
-        self._add_drone(drone)
+        """
+        Update the cluster of `drone` after its free resources changed. With
+        reverse matching, the resources used by jobs are accounted when the jobs
+        are assigned and when they finish, so the drone keeps its cluster unless
+        the accounted resources changed.
+
+        When coalescing updates, the drone is only marked to be re-clustered at
+        the start of the next cycle.
+        """
+        if self._coalesce_updates:
+            if drone in self._drone_cluster:
+                self._dirty[drone] = None
+            return
+        if not self._reverse_matching:
+            self.unregister_drone(drone)
+            self._add_drone(drone)
+            return
+        try:
+            cluster = self._drone_cluster[drone]
+        except KeyError:
+            return
+        if cluster.key != self._cluster_key(self._free_resources[drone]):
+            self._remove_drone(drone)
+            self._add_drone(drone)
+            self._modified.set()
 
     async def run(self):
         async with Scope() as scope:
             scope.do(self._collect_jobs())
-            async for _ in interval(self.interval):
-                for job in self.job_queue.copy():
-                    best_match = self._schedule_job(job)
-                    if best_match:
-                        await best_match.schedule_job(job)
-                        self.job_queue.remove(job)
-                        await sampling_required.put(self.job_queue)
-                        self.unregister_drone(best_match)
-                        left_resources = best_match.theoretical_available_resources
-                        left_resources = {
-                            key: value - job.resources.get(key, 0)
-                            for key, value in left_resources.items()
-                        }
-                        self._add_drone(best_match, left_resources)
+            if self._reverse_matching:
+                scope.do(self._refill_drones(), volatile=True)
+            async for _ in self._negotiation_cycles():
+                self._update_dirty_drones()
+                await self._schedule_queue()
                 if (
                     not self._collecting
                     and not self.job_queue
@@ -109,51 +513,238 @@ class CondorJobScheduler(object):
                     break
                 await sampling_required.put(self)
 
+    async def _schedule_queue(self):
+        """Match the queued jobs to drones, in the order of the queue"""
+        if not self._may_match():
+            return
+        max_matches, max_evaluations = self._max_matches, self._max_evaluations
+        if max_matches is None and max_evaluations is None:
+            jobs = iter(self.job_queue)
+        else:
+            jobs = self.job_queue.resume()
+        matches = evaluations = 0
+        for job in jobs:
+            if (max_matches is not None and matches >= max_matches) or (
+                max_evaluations is not None and evaluations >= max_evaluations
+            ):
+                break
+            shape = self.job_queue.shape(job)
+            if shape in self._failed_shapes:
+                continue
+            evaluations += 1
+            best_match = self._schedule_shape(shape, job)
+            if not best_match:
+                self._unmatched(job)
+                if self._failed_shapes.issuperset(self.job_queue.shapes):
+                    break
+                continue
+            best_match = self._admit(job, best_match)
+            if best_match is None:
+                continue
+            matches += 1
+            await self._start_job(job, best_match)
+
+    def _may_match(self) -> bool:
+        """
+        Whether any drone has enough free resources for the smallest queued
+        job shape, i.e. the minimum of each resource requested by the shapes
+        """
+        smallest = self._smallest_shape()
+        if smallest is None:
+            return False
+        for cluster in self._cluster_index.candidates(smallest):
+            free = self._drone_resources(cluster.representative)
+            if all(free.get(key, 0) >= value for key, value in smallest.items()):
+                return True
+        return False
+
+    def _smallest_shape(self) -> Optional[Dict]:
+        """The minimum of each resource requested by the queued job shapes"""
+        if self._schema is not None:
+            smallest = None
+            for shape in self.job_queue.shapes:
+                smallest = (
+                    shape if smallest is None else tuple(map(min, smallest, shape))
+                )
+            return dict(self._schema.pairs(smallest)) if smallest is not None else None
+        smallest = None
+        for shape in self.job_queue.shapes:
+            if smallest is None:
+                smallest = {key: value for key, value in shape if value > 0}
+                continue
+            requested = dict(shape)
+            for resource_type in list(smallest):
+                amount = min(smallest[resource_type], requested.get(resource_type, 0))
+                if amount > 0:
+                    smallest[resource_type] = amount
+                else:
+                    del smallest[resource_type]
+        return smallest
+
+    def _unmatched(self, job):
+        """Hook called for jobs that no drone is found for"""
+
+    def _admit(self, job, drone: Drone) -> Optional[Drone]:
+        """Hook to confirm the `drone` selected for `job` or to select another"""
+        return drone
+
+    async def _refill_drones(self):
+        """
+        Refill drones that freed resources with the first queued jobs fitting
+        into them.
+        """
+        while True:
+            await self._refill
+            self._refill.clear()
+            while self._freed:
+                drone = next(iter(self._freed))
+                del self._freed[drone]
+                await self._fill_drone(drone)
+
+    async def _fill_drone(self, drone: Drone):
+        while drone in self._drone_cluster:
+            job = self.job_queue.next_fitting(self._free_resources[drone])
+            if job is None:
+                break
+            await self._start_job(job, drone)
+
+    async def _start_job(self, job, drone: Drone):
+        """Hand `job` to `drone` and remove it from the queue"""
+        if self._reverse_matching:
+            self._assign_job(job, drone)
+            await drone.schedule_job(job)
+            await sampling_required.put(self.job_queue)
+            return
+        await drone.schedule_job(job)
+        self.job_queue.remove(job)
+        await sampling_required.put(self.job_queue)
+        # the drone has not claimed the resources of the job yet
+        self.unregister_drone(drone)
+        left_resources = drone.theoretical_available_resources.copy()
+        _take(left_resources, job.resources)
+        self._add_drone(drone, left_resources)
+
+    def _assign_job(self, job, drone: Drone):
+        """
+        Remove `job` from the queue and account its resources on `drone`. This
+        must happen before the job is handed to the drone, so that concurrent
+        matching does not see the drone with the resources of the job.
+        """
+        self.job_queue.remove(job)
+        _take(self._free_resources[drone], job.resources)
+        self._job_drone[job] = drone
+        self._remove_drone(drone)
+        self._add_drone(drone)
+
+    def _release_job(self, job):
+        """Return the resources accounted for `job` to its drone"""
+        try:
+            drone = self._job_drone.pop(job)
+            free_resources = self._free_resources[drone]
+        except KeyError:
+            return
+        _give(free_resources, job.resources)
+        if self._coalesce_updates:
+            self._dirty[drone] = None
+        else:
+            self._remove_drone(drone)
+            self._add_drone(drone)
+        if self._reverse_matching:
+            self._freed[drone] = None
+            self._refill.set()
+
+    async def _negotiation_cycles(self):
+        """
+        Pause until the next negotiation cycle is due and provide its time.
+        """
+        if not self._event_driven:
+            async for now in interval(self.interval):
+                yield now
+            return
+        if self._aligned:
+            # wake up whenever a polling scheduler runs its cycle, so that both
+            # resume at the same points in time and in the same order relative
+            # to other activities, but skip cycles without modifications
+            async for now in interval(self.interval):
+                if self._modified:
+                    self._modified.clear()
+                    yield now
+            return
+        while True:
+            await self._modified
+            self._modified.clear()
+            yield time.now
+
     async def _collect_jobs(self):
-        async for job in self._stream_queue:
-            self.job_queue.append(job)
-            await self._processing.increase(jobs=1)
-            # TODO: logging happens with each job
+        async for jobs in self._stream_queue:
+            # jobs are submitted on their own or in batches
+            if type(jobs) is not list:
+                jobs = (jobs,)
+            for job in jobs:
+                self.job_queue.append(job)
+            self._modified.set()
+            await self._processing.increase(jobs=len(jobs))
+            # TODO: logging happens with each job unless submitted in batches
             await sampling_required.put(self.job_queue)
         self._collecting = False
+        self._modified.set()
 
     async def job_finished(self, job):
+        self._release_job(job)
+        self._failed_shapes.clear()
         if job.successful:
             await self._processing.decrease(jobs=1)
+            self._modified.set()
         else:
             await self._stream_queue.put(job)
 
-    def _schedule_job(self, job) -> Drone:
+    def _schedule_shape(self, shape: Tuple, job) -> Optional[Drone]:
+        """
+        Select a drone for `job` of the given `shape`. The cluster selected for
+        a shape is reused until that cluster loses its representative. The
+        failure to find a cluster is reused until a drone is registered, a job
+        finishes or a cluster gets a representative with other free resources.
+        """
+        if shape in self._failed_shapes:
+            return None
+        try:
+            cluster = self._shape_matches[shape]
+        except KeyError:
+            cluster = self._select_cluster(job)
+            if cluster is None:
+                self._failed_shapes.add(shape)
+                return None
+            self._shape_matches[shape] = cluster
+            self._cluster_shapes.setdefault(cluster, set()).add(shape)
+        return cluster.representative
+
+    def _forget_matches(self, cluster: DroneCluster):
+        """Stop reusing `cluster` for the job shapes it was selected for"""
+        for shape in self._cluster_shapes.pop(cluster, ()):
+            del self._shape_matches[shape]
+
+    def _schedule_job(self, job) -> Optional[Drone]:
+        cluster = self._select_cluster(job)
+        return cluster.representative if cluster is not None else None
+
+    def _select_cluster(self, job) -> Optional[DroneCluster]:
+        if self._vectorized:
+            return self._cluster_index.select(job.resources, self.strategy)
         priorities = {}
-        for cluster in self.drone_cluster:
-            drone = cluster[0]
-            cost = 0
-            resources = drone.theoretical_available_resources
-            for resource_type in job.resources:
-                if resources.get(resource_type, 0) < job.resources[resource_type]:
-                    # Inf for all job resources that a drone does not support
-                    # and all resources that are too small to even be considered
-                    cost = float("Inf")
-                    break
-                else:
-                    try:
-                        cost += 1 / (
-                            resources[resource_type] // job.resources[resource_type]
-                        )
-                    except KeyError:
-                        pass
-            for additional_resource_type in [
-                key for key in drone.pool_resources if key not in job.resources
-            ]:
-                cost += resources[additional_resource_type]
-            cost /= len((*job.resources, *drone.pool_resources))
-            if cost <= 1:
+        shape = job_shape(job, self._schema)
+        for cluster in self._cluster_index.candidates(job.resources):
+            cost = self.cost_cache(
+                shape,
+                self._free_shape(cluster),
+                tuple(cluster.representative.pool_resources),
+            )
+            if cost <= self.strategy.threshold:
                 # directly start job
-                return drone
+                return cluster
             try:
-                priorities[cost].append(drone)
+                priorities[cost].append(cluster)
             except KeyError:
-                priorities[cost] = [drone]
+                priorities[cost] = [cluster]
         try:
             minimal_key = min(priorities)
             if minimal_key < float("Inf"):
@@ -161,3 +752,162 @@ class CondorJobScheduler(object):
         except ValueError:
             pass
         return None
+
+    def _free_shape(self, cluster: DroneCluster) -> Tuple:
+        """
+        Free resources of `cluster` as `(type, amount)` to calculate costs. With
+        reverse matching, these are the accounted resources of its key,
+        otherwise the free resources its representative currently reports.
+        """
+        if self._reverse_matching:
+            return cluster.key
+        resources = cluster.representative.theoretical_available_resources
+        if self._schema is not None:
+            return self._schema.amounts(resources)
+        return tuple(sorted((key, value) for key, value in resources.items() if value))
+
+    def _schema_cost(
+        self, job_shape: Tuple, free_shape: Tuple, resource_types: Tuple
+    ) -> float:
+        """Cost of the strategy for shapes given as amounts of the schema"""
+        pairs = self._schema.pairs
+        return self.strategy.cost(pairs(job_shape), pairs(free_shape), resource_types)
+
+
+class BackfillingJobScheduler(CondorJobScheduler):
+    """
+    Job scheduler that keeps jobs from being starved by smaller jobs behind
+    them in the queue.
+
+    In each negotiation cycle, the first `reservations` jobs that cannot be
+    started get a reservation on the drone where they can start the earliest.
+    When that will be is estimated from the
+    :py:attr:`~lapis.job.Job.requested_walltime` of the jobs running on the
+    drone. Jobs behind them are only put on a reserved drone if they do not
+    delay the reservation, i.e. if they are expected to end before it starts
+    or if the drone has enough resources left for both. Jobs without a
+    requested walltime are expected to run forever.
+
+    Reservations are planned on a :py:class:`~lapis.matching.Timeline` per
+    drone. Only drones of clusters whose representative provides the resources
+    of the job in total are considered, and timelines are created once per
+    cycle for the drones that are considered. Drones that are refilled via
+    `reverse_matching` do not consider reservations.
+
+    :param job_queue: queue the jobs to schedule are submitted to
+    :param reservations: number of jobs that get a reservation per cycle
+    :param kwargs: see :py:class:`CondorJobScheduler`
+    """
+
+    def __init__(self, job_queue, reservations: int = 1, **kwargs):
+        super(BackfillingJobScheduler, self).__init__(job_queue, **kwargs)
+        self._reservations = reservations
+        # state of the current negotiation cycle
+        self._now = 0
+        self._reservations_left = 0
+        # expected end of the running jobs per drone
+        self._running: Dict[Drone, Dict] = {}
+        self._running_drone: Dict = {}
+        # timelines and the drones with reservations in the current cycle
+        self._timelines: Dict[Drone, Timeline] = {}
+        self._reserved: Set[Drone] = set()
+
+    async def _schedule_queue(self):
+        self._now = time.now
+        self._reservations_left = self._reservations
+        await super(BackfillingJobScheduler, self)._schedule_queue()
+        self._timelines.clear()
+        self._reserved.clear()
+
+    def _unmatched(self, job):
+        if self._reservations_left > 0 and self._reserve(job, self._now):
+            self._reservations_left -= 1
+
+    def _admit(self, job, drone: Drone) -> Optional[Drone]:
+        if not self._reserved:
+            return drone
+        return self._backfill(drone, job, self._now)
+
+    def _backfill(self, drone: Drone, job, now: float) -> Optional[Drone]:
+        """
+        Select a drone from the cluster of `drone` on which `job` does not
+        delay any reservation
+        """
+        end = now + _expected_walltime(job)
+        for candidate in self._drone_cluster[drone]:
+            if candidate not in self._reserved or self._timelines[candidate].fits(
+                now, end, job.resources
+            ):
+                return candidate
+        return None
+
+    def _reserve(self, job, now: float) -> bool:
+        """
+        Reserve resources for `job` on the drone it can start on earliest
+
+        :return: whether a reservation could be made
+        """
+        duration = _expected_walltime(job)
+        best_start, best_drone = float("Inf"), None
+        for cluster in self._cluster_index.candidates(job.resources):
+            for drone in cluster:
+                start = self._timeline(drone, now).earliest(
+                    duration, job.resources, before=best_start
+                )
+                if start < best_start:
+                    best_start, best_drone = start, drone
+        if best_drone is None:
+            return False
+        self._timelines[best_drone].reserve(
+            best_start, best_start + duration, job.resources
+        )
+        self._reserved.add(best_drone)
+        return True
+
+    def _timeline(self, drone: Drone, now: float) -> Timeline:
+        """Timeline of `drone` for the current cycle"""
+        try:
+            return self._timelines[drone]
+        except KeyError:
+            pass
+        running = self._running.get(drone, {})
+        free = dict(drone.pool_resources)
+        for job in running:
+            for key, value in job.resources.items():
+                if key in free:
+                    free[key] -= value
+        # jobs exceeding their requested walltime may end any moment
+        timeline = self._timelines[drone] = Timeline(
+            now, free, ((max(end, now), job.resources) for job, end in running.items())
+        )
+        return timeline
+
+    async def _start_job(self, job, drone: Drone):
+        end = time.now + _expected_walltime(job)
+        self._running.setdefault(drone, {})[job] = end
+        self._running_drone[job] = drone
+        try:
+            timeline = self._timelines[drone]
+        except KeyError:
+            pass
+        else:
+            timeline.reserve(time.now, end, job.resources)
+        await super(BackfillingJobScheduler, self)._start_job(job, drone)
+
+    async def job_finished(self, job):
+        try:
+            drone = self._running_drone.pop(job)
+        except KeyError:
+            pass
+        else:
+            running = self._running[drone]
+            del running[job]
+            if not running:
+                del self._running[drone]
+        await super(BackfillingJobScheduler, self).job_finished(job)
+
+
+def _expected_walltime(job) -> float:
+    if job.requested_walltime is None:
+        return float("Inf")
+    return job.requested_walltime
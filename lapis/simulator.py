@@ -1,11 +1,15 @@
 import logging
 import random
 from functools import partial
+from typing import Iterable, Optional
 
 from usim import run, time, until, Scope, Queue
 
+from lapis.calendar import CompletionCalendar
 from lapis.drone import Drone
-from lapis.job import job_to_queue_scheduler
+from lapis.job import ResidentJobs, job_to_queue_scheduler
+from lapis.job_cache import JobCache
+from lapis.job_table import JobTable
 from lapis.monitor.general import (
     user_demand,
     job_statistics,
@@ -15,15 +19,47 @@ from lapis.monitor.general import (
     job_events,
 )
 from lapis.monitor import Monitoring
+from lapis.registry import DroneRegistry, RegisteredDrone
+from lapis.resources import ResourceSchema
 from lapis.monitor.cobald import drone_statistics, pool_statistics
 
-
 logging.getLogger("implementation").propagate = False
 
 
 class Simulator(object):
-    def __init__(self, seed=1234):
+    """
+    :param seed: seed for random number generation
+    :param calendar: whether drones complete their jobs via a shared
+                     :py:class:`~lapis.calendar.CompletionCalendar` instead of
+                     keeping an activity per running job
+    :param registry: whether drones store their state in a shared
+                     :py:class:`~lapis.registry.DroneRegistry`
+    :param resource_types: resource types of the
+                           :py:class:`~lapis.resources.ResourceSchema` to
+                           account the resources of jobs and drones in, which
+                           must include all resource types of jobs and drones
+    :param max_resident_jobs: maximum number of submitted jobs that did not
+                              finish yet, further jobs are submitted late
+    :param batch_submission: whether to submit the jobs sharing a queue date
+                             at once
+    """
+
+    def __init__(
+        self,
+        seed=1234,
+        calendar: bool = False,
+        registry: bool = False,
+        resource_types: Iterable[str] = None,
+        max_resident_jobs: int = None,
+        batch_submission: bool = False,
+    ):
         random.seed(seed)
+        self.calendar = CompletionCalendar() if calendar else None
+        self.registry = DroneRegistry() if registry else None
+        self.schema = ResourceSchema(resource_types) if resource_types else None
+        #: jobs submitted to the simulation that did not finish yet
+        self.resident_jobs = ResidentJobs(limit=max_resident_jobs)
+        self.batch_submission = batch_submission
         self.job_queue = Queue()
         self.pools = []
         self.controllers = []
@@ -46,22 +82,58 @@ class Simulator(object):
         self.monitoring.register_statistic(pool_status)
         self.monitoring.register_statistic(configuration_information)
 
-    def create_job_generator(self, job_input, job_reader):
+    def create_job_generator(
+        self,
+        job_input,
+        job_reader,
+        columnar: bool = False,
+        cache: Optional[JobCache] = None,
+    ):
+        """
+        :param job_input: input to read jobs from
+        :param job_reader: callable creating jobs from the `job_input`
+        :param columnar: whether to read all jobs into a
+                         :py:class:`~lapis.job_table.JobTable` right away and
+                         only create the jobs once they are submitted
+        :param cache: :py:class:`~lapis.job_cache.JobCache` to take the
+                      :py:class:`~lapis.job_table.JobTable` of the jobs from,
+                      implies `columnar`
+        """
+        if cache is not None:
+            job_input, job_reader = cache.table(job_input, job_reader), iter
+        elif columnar:
+            job_table = JobTable()
+            job_table.extend(job_reader(job_input))
+            job_input, job_reader = job_table, iter
         self._job_generators.append((job_input, job_reader))
 
     def create_pools(self, pool_input, pool_reader, pool_type, controller=None):
         assert self.job_scheduler, "Scheduler needs to be created before pools"
+        if self.registry is None:
+            make_drone = partial(
+                Drone, self.job_scheduler, calendar=self.calendar, schema=self.schema
+            )
+        else:
+            make_drone = partial(
+                RegisteredDrone,
+                self.job_scheduler,
+                calendar=self.calendar,
+                registry=self.registry,
+            )
         for pool in pool_reader(
-            iterable=pool_input,
-            pool_type=pool_type,
-            make_drone=partial(Drone, self.job_scheduler),
+            iterable=pool_input, pool_type=pool_type, make_drone=make_drone
         ):
             self.pools.append(pool)
             if controller:
                 self.controllers.append(controller(target=pool, rate=1))
 
     def create_scheduler(self, scheduler_type):
-        self.job_scheduler = scheduler_type(job_queue=self.job_queue)
+        if self.schema is None:
+            self.job_scheduler = scheduler_type(job_queue=self.job_queue)
+        else:
+            self.job_scheduler = scheduler_type(
+                job_queue=self.job_queue, schema=self.schema
+            )
 
     def run(self, until=None):
         print(f"running until {until}")
@@ -75,6 +147,8 @@ class Simulator(object):
             for job_input, job_reader in self._job_generators:
                 while_running.do(self._queue_jobs(job_input, job_reader))
             while_running.do(self.job_scheduler.run())
+            if self.calendar is not None:
+                while_running.do(self.calendar.run(), volatile=True)
             for controller in self.controllers:
                 while_running.do(controller.run(), volatile=True)
             while_running.do(self.monitoring.run(), volatile=True)
@@ -83,5 +157,9 @@ class Simulator(object):
 
     async def _queue_jobs(self, job_input, job_reader):
         await job_to_queue_scheduler(
-            job_generator=job_reader(job_input), job_queue=self.job_queue
+            job_generator=job_reader(job_input),
+            job_queue=self.job_queue,
+            schema=self.schema,
+            resident_jobs=self.resident_jobs,
+            batch=self.batch_submission,
         )
@@ -0,0 +1,196 @@
+from typing import Dict, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class MatchingStrategy(object):
+    """
+    Policy for selecting the drone cluster a job is put on.
+
+    A strategy assigns a cost to putting a job on a cluster. The scheduler
+    selects the first cluster whose cost is at most the :py:attr:`threshold`,
+    otherwise the first cluster with minimal cost. Clusters are considered in
+    the order they were created. Clusters that cannot hold a job are never
+    selected and have a cost of `Inf`.
+
+    The cost only depends on the shape of the job and the shape of the
+    cluster, so that it can be cached by the scheduler.
+    """
+
+    #: clusters with at most this cost are selected without looking further
+    threshold = float("-Inf")
+
+    def cost(
+        self, job_resources: Tuple, free_resources: Tuple, resource_types: Tuple
+    ) -> float:
+        """
+        Cost of putting a job on a drone cluster
+
+        :param job_resources: shape of the job, see
+                              :py:func:`~lapis.scheduler.job_shape`
+        :param free_resources: free resources of the cluster as
+                               `(type, amount)`
+        :param resource_types: resource types of the pool of the cluster
+        """
+        raise NotImplementedError
+
+    def costs(self, index, resources: Dict) -> "numpy.ndarray":
+        """
+        Cost of putting a job requesting `resources` on each row of a
+        :py:class:`~lapis.matching.VectorizedClusterIndex`
+
+        Rows that are not in use may have any cost.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def fits(index, resources: Dict) -> "numpy.ndarray":
+        """Rows of the `index` that can hold a job requesting `resources`"""
+        fitting = numpy.ones(len(index.free), dtype=bool)
+        for resource_type, requested in resources.items():
+            if requested <= 0:
+                continue
+            try:
+                fitting &= index.free[:, index.columns[resource_type]] >= requested
+            except KeyError:
+                fitting[:] = False
+        return fitting
+
+    def __repr__(self):
+        return "%s()" % self.__class__.__name__
+
+
+class FirstFit(MatchingStrategy):
+    """Select the first cluster that can hold the job"""
+
+    threshold = 0
+
+    def cost(
+        self, job_resources: Tuple, free_resources: Tuple, resource_types: Tuple
+    ) -> float:
+        resources = dict(free_resources)
+        for resource_type, requested in job_resources:
+            if resources.get(resource_type, 0) < requested:
+                return float("Inf")
+        return 0
+
+    def costs(self, index, resources: Dict) -> "numpy.ndarray":
+        return numpy.where(self.fits(index, resources), 0.0, numpy.inf)
+
+
+class BestFit(MatchingStrategy):
+    """
+    Select the cluster that is left with the smallest fraction of the requested
+    resources, preferring clusters that exactly fit the job
+    """
+
+    threshold = 0
+
+    def cost(
+        self, job_resources: Tuple, free_resources: Tuple, resource_types: Tuple
+    ) -> float:
+        resources = dict(free_resources)
+        cost = 0
+        for resource_type, requested in job_resources:
+            available = resources.get(resource_type, 0)
+            if available < requested:
+                return float("Inf")
+            if requested > 0:
+                cost += (available - requested) / available
+        return cost
+
+    def costs(self, index, resources: Dict) -> "numpy.ndarray":
+        costs = numpy.zeros(len(index.free))
+        fitting = self.fits(index, resources)
+        for resource_type, requested in sorted(resources.items()):
+            if requested > 0 and resource_type in index.columns:
+                available = index.free[:, index.columns[resource_type]]
+                costs += (available - requested) / available
+        costs[~fitting] = numpy.inf
+        return costs
+
+
+class WorstFit(BestFit):
+    """
+    Select the cluster that is left with the largest fraction of the requested
+    resources, spreading jobs across drones
+    """
+
+    threshold = float("-Inf")
+
+    def cost(
+        self, job_resources: Tuple, free_resources: Tuple, resource_types: Tuple
+    ) -> float:
+        cost = super(WorstFit, self).cost(job_resources, free_resources, resource_types)
+        return -cost if cost < float("Inf") else cost
+
+    def costs(self, index, resources: Dict) -> "numpy.ndarray":
+        costs = super(WorstFit, self).costs(index, resources)
+        return numpy.where(costs < numpy.inf, -costs, costs)
+
+
+class GridKa(MatchingStrategy):
+    """
+    Cost based strategy used at GridKa. The scheduler checks if a job either
+    exactly fits a slot or if it does fit into it several times. The cost for
+    putting a job at a given slot is given by the amount of resources that
+    might remain unallocated.
+    """
+
+    threshold = 1
+
+    def cost(
+        self, job_resources: Tuple, free_resources: Tuple, resource_types: Tuple
+    ) -> float:
+        resources = dict(free_resources)
+        requested_types = set()
+        cost = 0
+        for resource_type, requested in job_resources:
+            requested_types.add(resource_type)
+            if resources.get(resource_type, 0) < requested:
+                # Inf for all job resources that a drone does not support
+                # and all resources that are too small to even be considered
+                return float("Inf")
+            try:
+                cost += 1 / (resources[resource_type] // requested)
+            except KeyError:
+                pass
+        for additional_resource_type in resource_types:
+            if additional_resource_type not in requested_types:
+                cost += resources.get(additional_resource_type, 0)
+        return cost / (len(job_resources) + len(resource_types))
+
+    def costs(self, index, resources: Dict) -> "numpy.ndarray":
+        costs = numpy.zeros(len(index.free))
+        unrequested = numpy.ones(len(index.columns), dtype=bool)
+        # add up in the order of the job shape, as for single clusters
+        for resource_type, requested in sorted(resources.items()):
+            try:
+                column = index.columns[resource_type]
+            except KeyError:
+                if requested > 0:
+                    # no cluster provides this resource
+                    return numpy.full(len(index.free), numpy.inf)
+                continue
+            unrequested[column] = False
+            available = index.free[:, column]
+            if requested > 0:
+                costs += 1 / (available // requested)
+            costs[available < requested] = numpy.inf
+        # sum up column by column to add up exactly as for single clusters
+        for column in numpy.flatnonzero(unrequested):
+            costs += numpy.where(index.provided[:, column], index.free[:, column], 0)
+        costs /= len(resources) + index.pool_size
+        return costs
+
+
+#: strategies by the name used to select them
+strategies = {
+    "gridka": GridKa,
+    "first-fit": FirstFit,
+    "best-fit": BestFit,
+    "worst-fit": WorstFit,
+}
@@ -0,0 +1,27 @@
+from usim.typing import Condition
+
+
+class Modification(Condition):
+    """
+    Condition that is set on any modification waited for, e.g. one that might
+    allow the scheduler to match further jobs. In contrast to
+    :py:class:`usim.Flag` it can be set without suspending, so synchronous
+    callbacks can signal modifications.
+    """
+
+    __slots__ = ("_value",)
+
+    def __init__(self):
+        super(Modification, self).__init__()
+        self._value = False
+
+    def __bool__(self):
+        return self._value
+
+    def set(self):
+        if not self._value:
+            self._value = True
+            self.__trigger__()
+
+    def clear(self):
+        self._value = False
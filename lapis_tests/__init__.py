@@ -44,6 +44,10 @@ class DummyScheduler:
     def update_drone(drone: Drone):
         pass
 
+    @staticmethod
+    async def job_finished(job):
+        pass
+
 
 class DummyDrone:
     pass
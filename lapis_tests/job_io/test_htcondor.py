@@ -1,6 +1,19 @@
 import os
 import json
-from lapis.job_io.htcondor import htcondor_job_reader
+from io import StringIO
+
+import pytest
+
+from lapis.job_io.htcondor import (
+    htcondor_job_reader,
+    htcondor_csv_job_reader,
+    json_array_reader,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestHtcondorJobReader(object):
@@ -45,3 +58,77 @@ class TestHtcondorJobReader(object):
             readout = json.load(input_file)
             lines = sum(1 for _ in readout)
             assert jobs == (lines - 1)
+
+    def test_csv_read(self):
+        content = (
+            "QDate RequestCpus RequestWalltime RequestMemory RequestDisk "
+            "RemoteWallClockTime MemoryUsage DiskUsage_RAW RemoteSysCpu "
+            "RemoteUserCpu\n"
+            "1567155456 1 60 2000 6000000 100.0 2867 41898 10.0 40.0\n"
+            "1567155457 2 60 2000 6000000 0.0 2867 41898 10.0 40.0\n"
+            "\n"
+            "1567155458 undefined 60 2000.5 6000000 50.0 2867 41898 10.0 40.0\n"
+        )
+        jobs = list(htcondor_csv_job_reader(StringIO(content)))
+        # the job without walltime is removed, blank lines are ignored
+        assert len(jobs) == 2
+        assert jobs[0].resources == {
+            "cores": 1,
+            "memory": 2000 * 1024 * 1024,
+            "disk": 6000000 * 1024,
+        }
+        assert jobs[0].used_resources == {
+            "cores": 0.5,
+            "memory": 2867 * 1000 * 1000,
+            "disk": 41898 * 1024,
+        }
+        assert jobs[0].requested_walltime == 60
+        assert jobs[0].walltime == 100
+        assert jobs[0].queue_date == 1567155456
+        # requested resources that are not given fall back to the used ones
+        assert jobs[1].resources["cores"] == 1.0
+        assert jobs[1].resources["memory"] == int(2000.5 * 1024 * 1024)
+        assert jobs[1].used_resources["cores"] == 1.0
+
+    @pytest.mark.skipif(numpy is None, reason="requires numpy")
+    @pytest.mark.parametrize("chunk_size", [1, 4, 1000])
+    def test_csv_read_chunks(self, chunk_size):
+        def describe(job):
+            return [
+                (key, value, type(value))
+                for resources in (job.resources, job.used_resources)
+                for key, value in resources.items()
+            ] + [job.queue_date]
+
+        with open(
+            os.path.join(os.path.dirname(__file__), "..", "data", "htcondor_jobs.csv")
+        ) as input_file:
+            jobs = [describe(job) for job in htcondor_job_reader(input_file)]
+            input_file.seek(0)
+            # the chunk with the job without walltime is converted as well
+            chunked_jobs = [
+                describe(job)
+                for job in htcondor_job_reader(input_file, chunk_size=chunk_size)
+            ]
+        assert chunked_jobs == jobs
+
+    @pytest.mark.parametrize("buffer_size", [1, 7, 64 * 1024])
+    def test_json_array_read(self, buffer_size):
+        with open(
+            os.path.join(
+                os.path.dirname(__file__), "..", "data", "job_list_minimal.json"
+            )
+        ) as input_file:
+            content = input_file.read()
+        entries = list(json_array_reader(StringIO(content), buffer_size=buffer_size))
+        assert entries == json.loads(content)
+        # values are not cut at the end of the buffer
+        entries = json_array_reader(
+            StringIO(' [12345, "a b", true ,[], {"c": 1.5e3}]\n'),
+            buffer_size=buffer_size,
+        )
+        assert list(entries) == [12345, "a b", True, [], {"c": 1500.0}]
+        assert list(json_array_reader(StringIO("[ ]"), buffer_size)) == []
+        for content in ("", '{"a": 1}', "[1, 2", "[1 2]", "[1,]"):
+            with pytest.raises(json.JSONDecodeError):
+                list(json_array_reader(StringIO(content), buffer_size=buffer_size))
@@ -1,4 +1,6 @@
 import os
+from tempfile import NamedTemporaryFile
+
 from lapis.job_io.swf import swf_job_reader
 
 
@@ -12,3 +14,43 @@ class TestSwfJobReader(object):
                 assert job is not None
                 job_count += 1
             assert job_count > 0
+
+    def test_read_values(self):
+        with NamedTemporaryFile(mode="w+", suffix=".swf") as input_file:
+            input_file.write(
+                "; comment\n"
+                "    1   0 10  100 4  90  1000 8  200  2000 1 1 1 1 1 1 -1 -1\n"
+                "    2   5 10  100 4  90    -1 -1  -1    -1 1 1 1 1 1 1 -1 -1\n"
+            )
+            input_file.flush()
+            for memory_map in (False, True):
+                input_file.seek(0)
+                jobs = list(swf_job_reader(input_file, memory_map=memory_map))
+                assert [job.name for job in jobs] == ["1", "2"]
+                assert [job.queue_date for job in jobs] == [0, 5]
+                # memory is given per processor
+                assert jobs[0].resources == {"cores": 8, "memory": 2000 * 8 * 1024}
+                assert jobs[0].requested_walltime == 200
+                assert jobs[0].used_resources == {
+                    "cores": 4,
+                    "memory": 1000 * 4 * 1024,
+                }
+                assert jobs[0].walltime == 100
+                # requested values that are not given are 0
+                assert jobs[1].resources == {"cores": 0, "memory": 0}
+                assert jobs[1].requested_walltime == 0
+                assert jobs[1].used_resources == {"cores": 4, "memory": -1 * 4 * 1024}
+
+    def test_memory_map(self):
+        with open(
+            os.path.join(os.path.dirname(__file__), "..", "data", "swf_jobs.swf")
+        ) as input_file:
+            jobs = [
+                (job.name, job.resources, job.used_resources, job.queue_date)
+                for job in swf_job_reader(input_file)
+            ]
+            mapped_jobs = [
+                (job.name, job.resources, job.used_resources, job.queue_date)
+                for job in swf_job_reader(input_file, memory_map=True)
+            ]
+        assert mapped_jobs == jobs
@@ -1,8 +1,9 @@
 import pytest
-from usim import Scope, time
+from usim import Queue, Scope, time
 
+from lapis.calendar import CompletionCalendar
 from lapis.drone import Drone
-from lapis.job import Job
+from lapis.job import Job, job_to_queue_scheduler
 from lapis_tests import via_usim, DummyScheduler, DummyDrone
 
 
@@ -125,3 +126,82 @@ class TestJob(object):
         assert job_two.successful
         assert 0 == job_one.waiting_time
         assert 0 == job_two.waiting_time
+
+    @via_usim
+    async def test_jobs_in_calendar(self):
+        calendar = CompletionCalendar()
+        drone = Drone(
+            scheduler=DummyScheduler(),
+            pool_resources={"cores": 1, "memory": 1},
+            scheduling_duration=0,
+            calendar=calendar,
+        )
+        job_one, job_two = (
+            Job(
+                resources={"walltime": 50, "cores": 1, "memory": 1},
+                used_resources={"walltime": 10, "cores": 1, "memory": 1},
+            )
+            for _ in range(2)
+        )
+        job_killed = Job(
+            resources={"walltime": 50, "cores": 1, "memory": 1},
+            used_resources={"walltime": 10, "cores": 1, "memory": 2},
+        )
+        async with Scope() as scope:
+            scope.do(drone.run(), volatile=True)
+            scope.do(calendar.run(), volatile=True)
+            await drone.schedule_job(job=job_one)
+            await drone.schedule_job(job=job_two)
+            await (time + 5)
+            assert job_one.drone is drone
+            assert drone.theoretical_available_resources == {"cores": 0, "memory": 0}
+            await (time + 10)
+            assert job_one.successful and not job_two.successful
+            await drone.schedule_job(job=job_killed, kill=True)
+            await (time + 5)
+        assert 20 == time
+        assert not job_killed.successful
+        assert job_killed.drone is None
+        assert drone.jobs == 0 and len(calendar) == 0
+        assert drone.theoretical_available_resources == {"cores": 1, "memory": 1}
+
+    @via_usim
+    async def test_killed_job_in_drone(self):
+        job = Job(
+            resources={"walltime": 50, "cores": 1, "memory": 1},
+            used_resources={"walltime": 10, "cores": 1, "memory": 2},
+        )
+        drone = Drone(
+            scheduler=DummyScheduler(),
+            pool_resources={"cores": 2, "memory": 2},
+            scheduling_duration=0,
+        )
+        resources = drone.theoretical_available_resources
+        assert drone.theoretical_available_resources is resources
+        with pytest.raises(TypeError):
+            resources["cores"] = 0
+        await drone.run()
+        async with Scope() as scope:
+            scope.do(drone.schedule_job(job=job, kill=True))
+        assert 0 == time
+        assert not job.successful
+        assert drone.jobs == 0
+        assert resources == {"cores": 2, "memory": 2}
+        assert drone.available_resources == {"cores": 2, "memory": 2}
+
+    @via_usim
+    async def test_batch_submission(self):
+        jobs = [
+            Job(
+                resources={"walltime": 50, "cores": 1, "memory": 1},
+                used_resources={"walltime": 10, "cores": 1, "memory": 1},
+                queue_date=queue_date,
+            )
+            for queue_date in (10, 10, 10, 20, 30, 30)
+        ]
+        job_queue = Queue()
+        await job_to_queue_scheduler(jobs, job_queue, batch=True)
+        assert 20 == time
+        batches = [batch async for batch in job_queue]
+        assert batches == [jobs[:3], jobs[3:4], jobs[4:]]
+        assert [job.in_queue_since for job in jobs] == [0, 0, 0, 10, 20, 20]
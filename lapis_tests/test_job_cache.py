@@ -0,0 +1,82 @@
+from functools import partial
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+
+import pytest
+
+from lapis.job_cache import JobCache
+from lapis.job_io.htcondor import htcondor_job_reader
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+JOBS = (
+    "QDate RequestCpus RequestWalltime RequestMemory RequestDisk "
+    "RemoteWallClockTime MemoryUsage DiskUsage_RAW RemoteSysCpu RemoteUserCpu\n"
+    "1567155456 1 60 2000 6000000 100.0 2867 41898 10.0 40.0\n"
+    "1567155457 2 60 2000 6000000 50.0 2867 41898 10.0 40.0\n"
+)
+
+
+def describe(job):
+    return [
+        (key, value, type(value))
+        for resources in (job.resources, job.used_resources)
+        for key, value in resources.items()
+    ] + [job.queue_date, job.walltime, job.requested_walltime]
+
+
+@pytest.mark.skipif(numpy is None, reason="requires numpy")
+class TestJobCache(object):
+    def test_table(self):
+        reads = []
+
+        def job_reader(iterable, **kwargs):
+            reads.append(iterable)
+            return htcondor_job_reader(iterable, **kwargs)
+
+        with TemporaryDirectory() as directory, NamedTemporaryFile(
+            "w+", suffix=".csv"
+        ) as job_input:
+            job_input.write(JOBS)
+            job_input.flush()
+            job_input.seek(0)
+            cache = JobCache(directory)
+            table = cache.table(job_input, job_reader)
+            assert len(reads) == 1
+            with open(job_input.name) as stream:
+                expected = [describe(job) for job in htcondor_job_reader(stream)]
+            # jobs have the same values, including their types, as those read
+            assert [describe(job) for job in table] == expected
+            # the input is only read again for a different reader or content
+            job_input.seek(0)
+            assert len(JobCache(directory).table(job_input, job_reader)) == 2
+            assert len(reads) == 1
+            job_input.seek(0)
+            cache.table(
+                job_input,
+                partial(
+                    job_reader, unit_conversion_mapping={"RemoteWallClockTime": 60}
+                ),
+            )
+            assert len(reads) == 2
+            job_input.seek(0, 2)
+            job_input.write(JOBS.splitlines()[-1])
+            job_input.flush()
+            job_input.seek(0)
+            assert len(cache.table(job_input, job_reader)) == 3
+            assert len(reads) == 3
+
+    def test_key(self):
+        with NamedTemporaryFile("w+", suffix=".csv") as job_input:
+            job_input.write(JOBS)
+            job_input.flush()
+            job_input.seek(10)
+            key = JobCache.key(job_input, htcondor_job_reader)
+            # the input is read from the same position afterwards
+            assert job_input.tell() == 10
+            assert key == JobCache.key(job_input, htcondor_job_reader)
+            assert key != JobCache.key(
+                job_input, partial(htcondor_job_reader, resource_name_mapping={})
+            )
@@ -0,0 +1,85 @@
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from lapis.job import Job
+from lapis.job_table import JobTable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ATTRIBUTES = (
+    "resources",
+    "used_resources",
+    "walltime",
+    "requested_walltime",
+    "queue_date",
+    "requested_inputfiles",
+    "used_inputfiles",
+)
+
+
+def make_jobs():
+    return [
+        Job(
+            resources={"walltime": 60, "cores": 1, "memory": 1024},
+            used_resources={"walltime": 10, "cores": 0.5, "memory": 512},
+            queue_date=5.5,
+            name="first",
+        ),
+        Job(
+            resources={"cores": 2},
+            used_resources={
+                "walltime": 20,
+                "cores": 2,
+                "disk": 4,
+                "inputfiles": {"a.root": {"usedsize": 10}},
+            },
+            queue_date=6,
+        ),
+    ]
+
+
+def assert_copies(table: JobTable, jobs):
+    for row, job in enumerate(jobs):
+        copy = table.job(row)
+        assert copy is not job
+        for attribute in ATTRIBUTES:
+            assert getattr(copy, attribute) == getattr(job, attribute)
+        assert copy._name == job._name
+        # columns only holding integers are restored as integers
+        assert type(copy.resources["cores"]) is int
+        assert type(copy.walltime) is int
+    # the columns of used cores and queue dates also hold floats
+    assert type(table.job(1).used_resources["cores"]) is float
+    assert type(table.job(1).queue_date) is float
+
+
+class TestJobTable(object):
+    def test_append(self):
+        table = JobTable()
+        jobs = make_jobs()
+        table.extend(jobs)
+        assert len(table) == 2
+        assert set(table.resources) == {"cores", "memory", "disk"}
+        assert_copies(table, jobs)
+        assert table.job(1).resources == {"cores": 2, "disk": 4}
+        assert table.requested_walltime[0] == 60 and table.walltime[1] == 20
+
+    @pytest.mark.skipif(numpy is None, reason="requires numpy")
+    def test_save_load(self):
+        table = JobTable()
+        jobs = make_jobs()
+        table.extend(jobs)
+        with TemporaryDirectory() as directory:
+            table.save(directory)
+            loaded = JobTable.load(directory)
+            assert len(loaded) == len(table)
+            assert_copies(loaded, jobs)
+            # amounts are plain floats, not numpy scalars
+            assert type(loaded.walltime[0]) is float
+            del loaded
+            JobTable().save(directory)
+            assert len(JobTable.load(directory)) == 0
@@ -0,0 +1,37 @@
+from functools import partial
+
+from usim import Scope, time
+
+from lapis.drone import Drone
+from lapis.job import Job
+from lapis.pool import Pool
+from lapis_tests import via_usim, DummyScheduler
+
+
+class TestPool(object):
+    @via_usim
+    async def test_allocation_and_utilisation(self):
+        pool = Pool(
+            make_drone=partial(Drone, DummyScheduler(), {"cores": 2, "memory": 2}),
+            init=2,
+        )
+        assert pool.allocation == 1 and pool.utilisation == 1
+        async with Scope() as scope:
+            await pool.init_pool(scope=scope, init=2)
+            first, second = pool._drones
+            scope.do(
+                first.schedule_job(
+                    Job(
+                        resources={"walltime": 50, "cores": 1, "memory": 2},
+                        used_resources={"walltime": 10, "cores": 1, "memory": 1},
+                    )
+                )
+            )
+            await (time + 5)
+            assert first.allocation == 0.5 and first.utilisation == 0
+            assert pool.allocation == 0.75 and pool.utilisation == 0.5
+        assert 10 == time
+        assert pool.allocation == 1 and pool.utilisation == 1
+        pool._remove_drone(first)
+        pool._remove_drone(second)
+        assert pool.allocation == 1 and pool.utilisation == 1
@@ -0,0 +1,68 @@
+from usim import Scope, time
+
+from lapis.job import Job
+from lapis.registry import DroneRegistry, RegisteredDrone
+from lapis_tests import via_usim, DummyScheduler
+
+
+class TestDroneRegistry(object):
+    def test_add(self):
+        registry = DroneRegistry()
+        assert registry.add({"cores": 8, "memory": 16}) == 0
+        assert registry.add({"cores": 4, "disk": 100}) == 1
+        assert len(registry) == 2
+        assert list(registry.pool_resources["cores"]) == [8, 4]
+        assert list(registry.free_resources["disk"]) == [0, 100]
+        assert registry.resource_types == [("cores", "memory"), ("cores", "disk")]
+        assert list(registry.supply) == [0, 0] and list(registry.jobs) == [0, 0]
+
+    def test_remove(self):
+        registry = DroneRegistry()
+        for _ in range(3):
+            registry.add({"cores": 8})
+        registry.free_resources["cores"][1] = 2
+        registry.remove(1)
+        assert len(registry) == 2
+        assert registry.free_resources["cores"][1] == 0
+        # the row of the removed drone is reused
+        assert registry.add({"cores": 4, "memory": 16}) == 1
+        assert registry.free_resources["cores"][1] == 4
+        assert list(registry.pool_resources["memory"]) == [0, 16, 0]
+        assert registry.add({"cores": 1}) == 3
+
+    @via_usim
+    async def test_drones(self):
+        registry = DroneRegistry()
+        drones = [
+            RegisteredDrone(
+                scheduler=DummyScheduler(),
+                pool_resources={"cores": 2, "memory": 2},
+                scheduling_duration=0,
+                registry=registry,
+            )
+            for _ in range(2)
+        ]
+        job = Job(
+            resources={"walltime": 50, "cores": 1, "memory": 1},
+            used_resources={"walltime": 10, "cores": 1, "memory": 1},
+        )
+        async with Scope() as scope:
+            for drone in drones:
+                scope.do(drone.run(), volatile=True)
+            await drones[1].schedule_job(job)
+            await (time + 5)
+            assert list(registry.supply) == [1, 1]
+            assert list(registry.jobs) == [0, 1] and drones[1].jobs == 1
+            assert list(registry.free_resources["cores"]) == [2, 1]
+            assert drones[1].theoretical_available_resources == {
+                "cores": 1,
+                "memory": 1,
+            }
+            assert drones[1].allocation == registry.allocation[1] == 0.5
+            await (time + 10)
+            assert job.successful
+            assert list(registry.jobs) == [0, 0]
+            assert drones[1].available_resources == {"cores": 2, "memory": 2}
+            await drones[0].shutdown()
+        assert len(registry) == 1
+        assert registry.add({"cores": 1}) == drones[0].id
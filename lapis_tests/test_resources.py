@@ -0,0 +1,54 @@
+import pytest
+
+from lapis.job import Job
+from lapis.resources import ResourceSchema, VectorView
+
+
+class TestResourceSchema(object):
+    def test_vector(self):
+        schema = ResourceSchema(["memory", "disk", "cores"])
+        assert schema.types == ("cores", "disk", "memory")
+        vector = schema.vector({"memory": 16, "cores": 8})
+        assert vector.amounts == [8, 0, 16]
+        assert vector == {"cores": 8, "memory": 16}
+        assert list(vector.items()) == [("cores", 8), ("memory", 16)]
+        assert "disk" not in vector and "gpus" not in vector
+        with pytest.raises(KeyError):
+            vector["disk"]
+        with pytest.raises(KeyError):
+            schema.vector({"gpus": 1})
+        vector["disk"] = 0
+        assert len(vector) == 3 and vector.get("disk") == 0
+
+    def test_amounts(self):
+        schema = ResourceSchema(["cores", "disk", "memory"])
+        assert schema.amounts({"memory": 16, "cores": 8}) == (8, 0, 16)
+        assert schema.amounts(VectorView(schema.vector({"cores": 1}))) == (1, 0, 0)
+        assert schema.pairs((8, 0, 16)) == (("cores", 8), ("memory", 16))
+
+    def test_accounting(self):
+        schema = ResourceSchema(["cores", "disk", "memory"])
+        free = schema.vector({"cores": 8, "memory": 16})
+        job = schema.vector({"cores": 2, "memory": 16})
+        assert free.holds(job)
+        assert not free.holds(schema.vector({"cores": 2, "disk": 0}))
+        assert not free.holds(schema.vector({"cores": 9}))
+        copy = free.copy()
+        copy.decrease(job)
+        assert copy == {"cores": 6, "memory": 0} and not copy.holds(job)
+        copy.increase(job)
+        assert copy == free
+        assert free.compatible(job)
+        assert not free.compatible(ResourceSchema(["cores"]).vector({"cores": 1}))
+
+    def test_job(self):
+        job = Job(
+            resources={"walltime": 50, "cores": 1, "memory": 1},
+            used_resources={"walltime": 10, "cores": 1, "memory": 1},
+        )
+        with pytest.raises(KeyError):
+            job.vectorize(ResourceSchema(["cores"]))
+        job.vectorize(ResourceSchema(["cores", "memory"]))
+        assert job.resources.amounts == [1, 1]
+        assert job.used_resources == {"cores": 1, "memory": 1}
+        assert list(job.resources.values()) == [1, 1]
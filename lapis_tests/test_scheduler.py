@@ -0,0 +1,423 @@
+import random
+
+import pytest
+from usim import Queue
+
+from lapis.drone import Drone
+from lapis.job import Job
+from lapis.matching import ClusterIndex, DroneCluster, Timeline
+from lapis.resources import ResourceSchema
+from lapis.scheduler import CondorJobScheduler, JobQueue, job_shape
+from lapis.strategy import BestFit, FirstFit, GridKa, WorstFit
+from lapis_tests import DummyScheduler, via_usim
+
+
+def make_drone(**pool_resources) -> Drone:
+    return Drone(
+        scheduler=DummyScheduler(),
+        pool_resources=pool_resources,
+        scheduling_duration=0,
+    )
+
+
+def make_job(**resources) -> Job:
+    return Job(resources=resources, used_resources={"walltime": 10, **resources})
+
+
+class TestClusterIndex(object):
+    def test_candidates(self):
+        index = ClusterIndex()
+        clusters = [
+            DroneCluster([make_drone(cores=cores, memory=memory)])
+            for cores, memory in ((8, 16), (1, 32), (4, 4), (8, 32))
+        ]
+        for cluster in clusters:
+            index.add(cluster)
+        assert index.candidates({"cores": 4, "memory": 16}) == [
+            clusters[0],
+            clusters[3],
+        ]
+        assert index.candidates({"cores": 1}) == clusters
+        assert index.candidates({"cores": 0, "disk": 0}) == clusters
+        assert index.candidates({"disk": 1}) == []
+        assert index.candidates({"cores": 16}) == []
+        index.remove(clusters[0])
+        assert index.candidates({"cores": 4, "memory": 16}) == [clusters[3]]
+        assert len(index) == 3
+
+    def test_update(self):
+        index = ClusterIndex()
+        small, large = make_drone(cores=1), make_drone(cores=8)
+        cluster = DroneCluster([small, large])
+        index.add(cluster)
+        assert index.candidates({"cores": 4}) == []
+        cluster.remove(small)
+        index.update(cluster)
+        assert index.candidates({"cores": 4}) == [cluster]
+
+
+class TestTimeline(object):
+    def test_reserve(self):
+        timeline = Timeline(0, {"cores": 1}, [(100, {"cores": 2}), (50, {"cores": 1})])
+        assert list(timeline) == [
+            (0, {"cores": 1}),
+            (50, {"cores": 2}),
+            (100, {"cores": 4}),
+        ]
+        assert timeline.earliest(10, {"cores": 1}) == 0
+        assert timeline.earliest(10, {"cores": 3}) == 100
+        assert timeline.earliest(10, {"cores": 3}, before=100) == float("Inf")
+        assert timeline.earliest(10, {"cores": 8}) == float("Inf")
+        timeline.reserve(100, 200, {"cores": 3})
+        assert timeline.earliest(10, {"cores": 3}) == 200
+        assert timeline.fits(0, 100, {"cores": 1})
+        assert not timeline.fits(0, 101, {"cores": 2})
+        assert timeline.earliest(float("Inf"), {"cores": 2}) == 200
+
+
+class TestJobQueue(object):
+    def test_shapes(self):
+        queue = JobQueue()
+        jobs = [make_job(cores=1, memory=2), make_job(memory=2, cores=1)]
+        jobs.append(make_job(cores=2, memory=2))
+        for job in jobs:
+            queue.append(job)
+        assert queue.shape(jobs[0]) == queue.shape(jobs[1]) == job_shape(jobs[0])
+        assert len(queue.shapes) == 2
+        assert list(queue.shapes[job_shape(jobs[0])]) == jobs[:2]
+        queue.remove(jobs[2])
+        assert len(queue.shapes) == 1
+        assert list(queue) == jobs[:2]
+
+    def test_next_fitting(self):
+        queue = JobQueue()
+        jobs = [
+            make_job(cores=cores, memory=memory)
+            for cores, memory in ((4, 4), (1, 2), (2, 1), (1, 2))
+        ]
+        for job in jobs:
+            queue.append(job)
+        assert queue.next_fitting({"cores": 8, "memory": 8}) is jobs[0]
+        assert queue.next_fitting({"cores": 2, "memory": 2}) is jobs[1]
+        assert queue.next_fitting({"cores": 2, "memory": 1}) is jobs[2]
+        assert queue.next_fitting({"cores": 1}) is None
+        queue.remove(jobs[1])
+        assert queue.next_fitting({"cores": 1, "memory": 2}) is jobs[3]
+
+    def test_order(self):
+        queue = JobQueue()
+        jobs = [make_job(cores=1) for _ in range(5)]
+        for job in jobs:
+            queue.append(job)
+        assert list(queue) == jobs
+        queue.remove(jobs[0])
+        queue.remove(jobs[4])
+        queue.remove(jobs[2])
+        assert list(queue) == [jobs[1], jobs[3]]
+        assert len(queue) == 2 and jobs[1] in queue and jobs[2] not in queue
+        with pytest.raises(ValueError):
+            queue.remove(jobs[2])
+        queue.remove(jobs[1])
+        queue.remove(jobs[3])
+        assert not queue and list(queue) == []
+        queue.append(jobs[2])
+        assert list(queue) == [jobs[2]]
+
+    def test_modify_while_iterating(self):
+        queue = JobQueue()
+        jobs = [make_job(cores=1) for _ in range(5)]
+        for job in jobs[:4]:
+            queue.append(job)
+        visited = []
+        for job in queue:
+            visited.append(job)
+            if job is jobs[0]:
+                queue.remove(jobs[0])  # noqa: B909
+                queue.remove(jobs[1])  # noqa: B909
+            elif job is jobs[2]:
+                queue.remove(jobs[3])
+                queue.append(jobs[4])
+        assert visited == [jobs[0], jobs[2]]
+        assert list(queue) == [jobs[2], jobs[4]]
+
+    def test_resume(self):
+        queue = JobQueue()
+        jobs = [make_job(cores=1) for _ in range(5)]
+        for job in jobs:
+            queue.append(job)
+        for job in queue.resume():
+            if job is jobs[2]:
+                break
+        queue.remove(jobs[2])
+        queue.remove(jobs[0])
+        assert list(queue.resume()) == [jobs[3], jobs[4], jobs[1]]
+        assert list(queue.resume()) == [jobs[1], jobs[3], jobs[4]]
+
+
+class TestCondorJobScheduler(object):
+    def test_schedule_job(self):
+        scheduler = CondorJobScheduler(job_queue=Queue())
+        drones = [
+            make_drone(cores=cores, memory=memory)
+            for cores, memory in ((1, 1), (8, 4), (4, 4), (8, 4))
+        ]
+        for drone in drones:
+            scheduler.register_drone(drone)
+        assert len(scheduler.drone_cluster) == 3
+        assert scheduler._schedule_job(make_job(cores=16, memory=1)) is None
+        assert scheduler._schedule_job(make_job(cores=1, gpus=1)) is None
+        # exact fit is started directly
+        assert scheduler._schedule_job(make_job(cores=1, memory=1)) is drones[0]
+        # cheapest of the fitting clusters
+        assert scheduler._schedule_job(make_job(cores=2, memory=2)) is drones[1]
+        scheduler.unregister_drone(drones[1])
+        assert scheduler._schedule_job(make_job(cores=2, memory=2)) is drones[3]
+        scheduler.unregister_drone(drones[3])
+        assert scheduler._schedule_job(make_job(cores=8, memory=2)) is None
+
+    def test_drone_clusters(self):
+        scheduler = CondorJobScheduler(job_queue=Queue())
+        drones = [make_drone(cores=8), make_drone(cores=8), make_drone(cores=4)]
+        for drone in drones:
+            scheduler.register_drone(drone)
+        assert [list(cluster) for cluster in scheduler.drone_cluster] == [
+            drones[:2],
+            drones[2:],
+        ]
+        scheduler.unregister_drone(drones[0])
+        # unknown drones are ignored
+        scheduler.unregister_drone(drones[0])
+        scheduler.update_drone(drones[2])
+        assert [list(cluster) for cluster in scheduler.drone_cluster] == [
+            drones[1:2],
+            drones[2:],
+        ]
+        scheduler.register_drone(drones[0])
+        assert list(scheduler.drone_list) == [drones[1], drones[0], drones[2]]
+
+    def test_quantized_clusters(self):
+        scheduler = CondorJobScheduler(job_queue=Queue(), quantization={"memory": 1024})
+        drones = [
+            make_drone(cores=8, memory=memory) for memory in (2048, 3000, 1000, 500)
+        ]
+        drones.append(make_drone(cores=8))
+        for drone in drones:
+            scheduler.register_drone(drone)
+        assert [list(cluster) for cluster in scheduler.drone_cluster] == [
+            drones[:2],
+            drones[2:],
+        ]
+        for drone in drones:
+            scheduler.unregister_drone(drone)
+        assert scheduler.drone_cluster == [] and scheduler._clusters == {}
+
+    def test_schedule_shape(self):
+        scheduler = CondorJobScheduler(job_queue=Queue())
+        drones = [make_drone(cores=8, memory=8) for _ in range(3)]
+        for drone in drones:
+            scheduler.register_drone(drone)
+        job = make_job(cores=1, memory=1)
+        assert scheduler._schedule_shape(job_shape(job), job) is drones[0]
+        # new clusters do not invalidate the cluster selected for a shape
+        small_drone = make_drone(cores=1, memory=1)
+        scheduler.register_drone(small_drone)
+        lookups = scheduler.cost_cache.hits + scheduler.cost_cache.misses
+        assert scheduler._schedule_shape(job_shape(job), job) is drones[0]
+        assert scheduler.cost_cache.hits + scheduler.cost_cache.misses == lookups
+        # the free resources of the new representative may differ
+        scheduler.unregister_drone(drones[0])
+        assert scheduler._schedule_shape(job_shape(job), job) is drones[1]
+        scheduler.unregister_drone(drones[1])
+        scheduler.unregister_drone(drones[2])
+        assert scheduler._schedule_shape(job_shape(job), job) is small_drone
+        large_job = make_job(cores=16)
+        assert scheduler._schedule_shape(job_shape(large_job), large_job) is None
+        # failures are only retried once capacity may have grown
+        large_drone = make_drone(cores=16)
+        scheduler._add_drone(large_drone)
+        assert scheduler._schedule_shape(job_shape(large_job), large_job) is None
+        scheduler.unregister_drone(large_drone)
+        scheduler.register_drone(large_drone)
+        assert scheduler._schedule_shape(job_shape(large_job), large_job) is (
+            large_drone
+        )
+
+    @pytest.mark.parametrize("reverse_matching", [False, True])
+    def test_schema(self, reverse_matching):
+        schema = ResourceSchema(["cores", "memory"])
+        scheduler = CondorJobScheduler(
+            job_queue=Queue(), reverse_matching=reverse_matching, schema=schema
+        )
+        drones = [
+            Drone(
+                scheduler=DummyScheduler(),
+                pool_resources={"cores": cores, "memory": 8},
+                scheduling_duration=0,
+                schema=schema,
+            )
+            for cores in (1, 8, 2)
+        ]
+        for drone in drones:
+            scheduler.register_drone(drone)
+        assert [cluster.key for cluster in scheduler.drone_cluster] == [
+            (1, 8),
+            (8, 8),
+            (2, 8),
+        ]
+        jobs = [make_job(cores=2, memory=4), make_job(cores=1, memory=2)]
+        for job in jobs:
+            job.vectorize(schema)
+            scheduler.job_queue.append(job)
+        assert list(scheduler.job_queue.shapes) == [(2, 4), (1, 2)]
+        assert scheduler._smallest_shape() == {"cores": 1, "memory": 2}
+        assert scheduler._schedule_job(jobs[0]) is drones[1]
+        assert scheduler.job_queue.next_fitting(
+            drones[0].theoretical_available_resources
+        ) is (jobs[1])
+
+    def test_cost_cache(self):
+        scheduler = CondorJobScheduler(job_queue=Queue(), reverse_matching=True)
+        drones = [make_drone(cores=8, memory=8), make_drone(cores=4, memory=4)]
+        for drone in drones:
+            scheduler.register_drone(drone)
+        assert scheduler._schedule_job(make_job(cores=2, memory=2)) is drones[0]
+        assert scheduler.cost_cache.hits == 0
+        assert scheduler._schedule_job(make_job(cores=2, memory=2)) is drones[0]
+        assert scheduler.cost_cache.hits == 1
+        assert scheduler.cost_cache.hit_rate == 0.5
+        # cached costs follow drones moving between clusters
+        scheduler._free_resources[drones[0]] = {"cores": 1, "memory": 1}
+        scheduler.update_drone(drones[0])
+        assert scheduler._schedule_job(make_job(cores=2, memory=2)) is drones[1]
+        assert scheduler.cost_cache.misses == 2
+        scheduler._free_resources[drones[1]] = {"cores": 8, "memory": 8}
+        scheduler.update_drone(drones[1])
+        assert scheduler._schedule_job(make_job(cores=2, memory=2)) is drones[1]
+        # the cluster of the first drone is a candidate as well but too small
+        assert scheduler.cost_cache.hits == 2 and scheduler.cost_cache.misses == 3
+
+    @via_usim
+    async def test_accounting(self):
+        scheduler = CondorJobScheduler(
+            job_queue=Queue(), quantization={"memory": 1024}, reverse_matching=True
+        )
+        drone = make_drone(cores=8, memory=3000)
+        scheduler.register_drone(drone)
+        jobs = [make_job(cores=4, memory=1000) for _ in range(2)]
+        for job in jobs:
+            scheduler.job_queue.append(job)
+            scheduler._assign_job(job, drone)
+        assert scheduler._free_resources[drone] == {"cores": 0, "memory": 1000}
+        # resources reported by the drone do not include jobs not started yet
+        scheduler.update_drone(drone)
+        assert scheduler._drone_cluster[drone].key == ()
+        assert scheduler._schedule_job(make_job(cores=1)) is None
+        await scheduler.job_finished(jobs[0])
+        assert scheduler._free_resources[drone] == {"cores": 4, "memory": 2000}
+        assert scheduler._drone_cluster[drone].key == (("cores", 4), ("memory", 1024))
+
+    @via_usim
+    async def test_coalesce_updates(self):
+        scheduler = CondorJobScheduler(
+            job_queue=Queue(), reverse_matching=True, coalesce_updates=True
+        )
+        drone = make_drone(cores=8)
+        scheduler.register_drone(drone)
+        jobs = [make_job(cores=4) for _ in range(2)]
+        for job in jobs:
+            scheduler.job_queue.append(job)
+            scheduler._assign_job(job, drone)
+        # assigned jobs are accounted right away
+        assert scheduler._drone_cluster[drone].key == ()
+        for job in jobs:
+            await scheduler.job_finished(job)
+        assert scheduler._free_resources[drone] == {"cores": 8}
+        assert scheduler._drone_cluster[drone].key == ()
+        assert list(scheduler._dirty) == [drone]
+        scheduler._update_dirty_drones()
+        assert scheduler._drone_cluster[drone].key == (("cores", 8),)
+        assert not scheduler._dirty
+
+    @via_usim
+    async def test_budget(self):
+        scheduler = CondorJobScheduler(job_queue=Queue(), max_matches=2)
+        scheduler.register_drone(make_drone(cores=8))
+        jobs = [make_job(cores=1) for _ in range(5)]
+        for job in jobs:
+            scheduler.job_queue.append(job)
+        await scheduler._schedule_queue()
+        assert list(scheduler.job_queue) == jobs[2:]
+        await scheduler._schedule_queue()
+        assert list(scheduler.job_queue) == jobs[4:]
+
+    @via_usim
+    async def test_resume_cycle(self):
+        scheduler = CondorJobScheduler(job_queue=Queue(), max_evaluations=1)
+        scheduler.register_drone(make_drone(cores=8))
+        jobs = [make_job(cores=16), make_job(cores=1)]
+        for job in jobs:
+            scheduler.job_queue.append(job)
+        await scheduler._schedule_queue()
+        assert list(scheduler.job_queue) == jobs
+        # the second cycle continues after the job that did not fit
+        await scheduler._schedule_queue()
+        assert list(scheduler.job_queue) == jobs[:1]
+
+    def test_may_match(self):
+        scheduler = CondorJobScheduler(job_queue=Queue(), reverse_matching=True)
+        drone = make_drone(cores=2, memory=2)
+        scheduler.register_drone(drone)
+        assert not scheduler._may_match()
+        scheduler.job_queue.append(make_job(cores=4, memory=1))
+        assert not scheduler._may_match()
+        scheduler.job_queue.append(make_job(cores=1, memory=4))
+        # the smallest shape only requests one core and one unit of memory
+        assert scheduler._may_match()
+        # the drone provides enough resources in total but not right now
+        scheduler._free_resources[drone] = {"cores": 0, "memory": 2}
+        scheduler.update_drone(drone)
+        assert not scheduler._may_match()
+
+    def test_strategies(self):
+        drones = [
+            make_drone(cores=cores, memory=memory)
+            for cores, memory in ((8, 8), (2, 2), (16, 16))
+        ]
+        job = make_job(cores=2, memory=2)
+        expected = {GridKa: 0, FirstFit: 0, BestFit: 1, WorstFit: 2}
+        for strategy, index in expected.items():
+            scheduler = CondorJobScheduler(job_queue=Queue(), strategy=strategy())
+            for drone in drones:
+                scheduler.register_drone(drone)
+            assert scheduler._schedule_job(job) is drones[index], strategy
+            assert scheduler._schedule_job(make_job(cores=32)) is None
+
+    @pytest.mark.parametrize("strategy", [GridKa, FirstFit, BestFit, WorstFit])
+    def test_vectorized_schedule_job(self, strategy):
+        pytest.importorskip("numpy")
+        random.seed(1234)
+        scheduler = CondorJobScheduler(job_queue=Queue(), strategy=strategy())
+        vectorized = CondorJobScheduler(
+            job_queue=Queue(), strategy=strategy(), vectorized=True
+        )
+        drones = [
+            make_drone(
+                cores=random.randint(1, 8),
+                memory=random.randint(1, 8),
+                **({"disk": random.randint(0, 2)} if random.random() < 0.5 else {}),
+            )
+            for _ in range(50)
+        ]
+        for drone in drones:
+            scheduler.register_drone(drone)
+            vectorized.register_drone(drone)
+        for drone in drones[::3]:
+            scheduler.unregister_drone(drone)
+            vectorized.unregister_drone(drone)
+        for _ in range(200):
+            job = make_job(
+                cores=random.randint(1, 9),
+                memory=random.randint(1, 9),
+                **({"disk": random.randint(1, 2)} if random.random() < 0.3 else {}),
+            )
+            assert scheduler._schedule_job(job) is vectorized._schedule_job(job)
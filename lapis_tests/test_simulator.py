@@ -1,40 +1,225 @@
-from tempfile import NamedTemporaryFile
+import gc
+import os
+from functools import partial
+from tempfile import NamedTemporaryFile, TemporaryDirectory
 
+import pytest
+
+from lapis.job import Job
+from lapis.job_cache import JobCache
 from lapis.job_io.htcondor import htcondor_job_reader
 from lapis.pool import StaticPool
 from lapis.pool_io.htcondor import htcondor_pool_reader
-from lapis.scheduler import CondorJobScheduler
+from lapis.scheduler import BackfillingJobScheduler, CondorJobScheduler
 from lapis.simulator import Simulator
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# several jobs finish at the same time, others are submitted and finish exactly
+# when a cycle of the scheduler is due
+TRACE = "\n".join(
+    ["1567155456 1 600 2000 6000000 120.0 1000 41898 10.0 40.0"] * 5
+    + ["1567155456 2 60 2000 6000000 60.0 1000 41898 10.0 40.0"] * 3
+    + ["1567155516 1 300 2000 6000000 300.0 1000 41898 10.0 40.0"] * 4
+    + ["1567155576 4 600 2000 6000000 180.0 1000 41898 10.0 40.0"] * 2
+    + ["1567155581 1 60 2000 6000000 55.0 1000 41898 10.0 40.0"]
+    + ["1567156056 3 300 2000 6000000 30.0 1000 41898 10.0 40.0"] * 2
+)
+
 
 class TestSimulator(object):
     def test_simulation_exit(self):
-        simulator = Simulator()
-        with NamedTemporaryFile(suffix=".csv") as machine_config, NamedTemporaryFile(
-            suffix=".csv"
-        ) as job_config:
-            with open(machine_config.name, "w") as write_stream:
-                write_stream.write(
-                    "TotalSlotCPUs TotalSlotDisk TotalSlotMemory Count\n"
-                    "1 44624348.0 8000 1"
-                )
-            with open(job_config.name, "w") as write_stream:
-                write_stream.write(
-                    "QDate RequestCpus RequestWalltime RequestMemory RequestDisk "
-                    "RemoteWallClockTime MemoryUsage DiskUsage_RAW RemoteSysCpu "
-                    "RemoteUserCpu\n"
-                    "1567155456 1 60 2000 6000000 100.0 2867 41898 10.0 40.0"
-                )
-            job_input = open(job_config.name, "r+")
-            machine_input = open(machine_config.name, "r+")
+        jobs = "1567155456 1 60 2000 6000000 100.0 2867 41898 10.0 40.0"
+        assert 180 == simulate(CondorJobScheduler, jobs)
+
+    @pytest.mark.parametrize("aligned", [True, False])
+    def test_event_driven_simulation(self, aligned):
+        jobs = (
+            "1567155456 1 60 2000 6000000 100.0 2867 41898 10.0 40.0\n"
+            "1567155456 1 60 2000 6000000 100.0 2867 41898 10.0 40.0\n"
+            "1568155456 1 60 2000 6000000 100.0 2867 41898 10.0 40.0"
+        )
+        polling = simulate(CondorJobScheduler, jobs)
+        event_driven = simulate(
+            partial(CondorJobScheduler, event_driven=True, aligned=aligned), jobs
+        )
+        if aligned:
+            assert polling == event_driven
+        else:
+            assert polling >= event_driven
+
+    def test_aligned_boundary(self):
+        # the second job is submitted exactly when a cycle is due
+        jobs = (
+            "1567155456 1 60 2000 6000000 100.0 2867 41898 10.0 40.0\n"
+            "1567155696 1 60 2000 6000000 100.0 2867 41898 10.0 40.0"
+        )
+        polling = simulate(CondorJobScheduler, jobs)
+        event_driven = simulate(partial(CondorJobScheduler, event_driven=True), jobs)
+        assert polling == event_driven
+
+    def test_reverse_matching(self):
+        jobs = "\n".join(
+            ["1567155456 1 60 2000 6000000 100.0 2867 41898 10.0 40.0"] * 4
+        )
+        assert simulate(partial(CondorJobScheduler, event_driven=True), jobs) == 540
+        # jobs start as soon as the previous one finishes
+        assert (
+            simulate(
+                partial(CondorJobScheduler, event_driven=True, reverse_matching=True),
+                jobs,
+            )
+            == 480
+        )
+
+    def test_backfilling(self):
+        head = (
+            "1567155456 1 600 2000 6000000 600.0 2867 41898 10.0 40.0\n"
+            "1567155456 2 60 2000 6000000 60.0 2867 41898 10.0 40.0\n"
+        )
+        short_job = "1567155456 1 300 2000 6000000 300.0 2867 41898 10.0 40.0"
+        long_job = "1567155456 1 6000 2000 6000000 6000.0 2867 41898 10.0 40.0"
+        # short jobs fill the gap before the reservation of the second job
+        assert simulate(BackfillingJobScheduler, head + short_job, cores=2) == (
+            simulate(CondorJobScheduler, head + short_job, cores=2)
+        )
+        # long jobs are not allowed to delay it
+        assert simulate(BackfillingJobScheduler, head + long_job, cores=2) > (
+            simulate(CondorJobScheduler, head + long_job, cores=2)
+        )
+
+    @pytest.mark.parametrize(
+        "scheduler_options, options",
+        [
+            ({}, {"calendar": True}),
+            ({}, {"registry": True}),
+            ({}, {"registry": True, "calendar": True}),
+            ({}, {"resource_types": ("cores", "memory", "disk")}),
+            ({}, {"columnar": True}),
+            ({}, {"batch_submission": True}),
+            ({"coalesce_updates": True}, {}),
+        ],
+    )
+    @pytest.mark.parametrize(
+        "scheduler_type",
+        [
+            CondorJobScheduler,
+            partial(CondorJobScheduler, event_driven=True, reverse_matching=True),
+        ],
+    )
+    def test_equivalence(self, scheduler_type, scheduler_options, options):
+        assert simulate(
+            partial(scheduler_type, **scheduler_options),
+            TRACE,
+            cores=4,
+            drones=3,
+            **options
+        ) == simulate(scheduler_type, TRACE, cores=4, drones=3)
+
+    @pytest.mark.skipif(numpy is None, reason="requires numpy")
+    def test_job_cache(self):
+        with TemporaryDirectory() as directory:
+            # the first run fills the cache, the second one uses it
+            for _ in range(2):
+                assert simulate(
+                    CondorJobScheduler,
+                    TRACE,
+                    cores=4,
+                    drones=3,
+                    cache=JobCache(directory),
+                ) == simulate(CondorJobScheduler, TRACE, cores=4, drones=3)
+            assert len(os.listdir(directory)) == 1
+
+    def test_resident_jobs(self):
+        jobs = "\n".join(["1567155456 1 60 2000 6000000 60.0 1000 41898 10.0 40.0"] * 4)
+        gc.collect()
+        resident = jobs_in_memory()
+        simulator = run(CondorJobScheduler, jobs, cores=4)
+        assert simulator.resident_jobs.peak == 4
+        # jobs wait for previous jobs to finish when too many are resident
+        simulator = run(CondorJobScheduler, jobs, cores=4, max_resident_jobs=2)
+        assert simulator.resident_jobs.peak == 2
+        assert simulator.resident_jobs.count == 0
+        assert simulator.duration > simulate(CondorJobScheduler, jobs, cores=4)
+        # finished jobs are not kept
+        gc.collect()
+        assert jobs_in_memory() == resident
+
+    def test_batch_submission(self):
+        jobs = "\n".join(
+            ["1567155456 1 60 2000 6000000 60.0 1000 41898 10.0 40.0"] * 4
+            + ["1567155516 2 120 2000 6000000 120.0 1000 41898 10.0 40.0"] * 3
+        )
+        # batches are split when too many jobs are resident
+        assert simulate(
+            CondorJobScheduler,
+            jobs,
+            cores=4,
+            batch_submission=True,
+            max_resident_jobs=2,
+        ) == (simulate(CondorJobScheduler, jobs, cores=4, max_resident_jobs=2))
+
+
+def jobs_in_memory() -> int:
+    return sum(isinstance(obj, Job) for obj in gc.get_objects())
+
+
+def simulate(scheduler_type, jobs: str, **kwargs) -> float:
+    """
+    Simulate `jobs` given as lines of a htcondor export, see :py:func:`run`,
+    and return the duration of the simulation.
+    """
+    return run(scheduler_type, jobs, **kwargs).duration
+
+
+def run(
+    scheduler_type,
+    jobs: str,
+    cores: int = 1,
+    drones: int = 1,
+    columnar: bool = False,
+    cache: JobCache = None,
+    **options
+) -> Simulator:
+    """
+    Simulate `jobs` given as lines of a htcondor export on `drones` drones with
+    `cores` cores each and return the simulator. Jobs are read into a
+    :py:class:`~lapis.job_table.JobTable` first if `columnar` is set, or taken
+    from the `cache` if given. Further `options` are passed on to the
+    :py:class:`~lapis.simulator.Simulator`.
+    """
+    simulator = Simulator(**options)
+    with NamedTemporaryFile(suffix=".csv") as machine_config, NamedTemporaryFile(
+        suffix=".csv"
+    ) as job_config:
+        with open(machine_config.name, "w") as write_stream:
+            write_stream.write(
+                "TotalSlotCPUs TotalSlotDisk TotalSlotMemory Count\n"
+                "%d 44624348.0 8000 %d" % (cores, drones)
+            )
+        with open(job_config.name, "w") as write_stream:
+            write_stream.write(
+                "QDate RequestCpus RequestWalltime RequestMemory RequestDisk "
+                "RemoteWallClockTime MemoryUsage DiskUsage_RAW RemoteSysCpu "
+                "RemoteUserCpu\n" + jobs
+            )
+        with open(job_config.name, "r+") as job_input, open(
+            machine_config.name, "r+"
+        ) as machine_input:
             simulator.create_job_generator(
-                job_input=job_input, job_reader=htcondor_job_reader
+                job_input=job_input,
+                job_reader=htcondor_job_reader,
+                columnar=columnar,
+                cache=cache,
             )
-            simulator.create_scheduler(scheduler_type=CondorJobScheduler)
+            simulator.create_scheduler(scheduler_type=scheduler_type)
             simulator.create_pools(
                 pool_input=machine_input,
                 pool_reader=htcondor_pool_reader,
                 pool_type=StaticPool,
             )
             simulator.run()
-            assert 180 == simulator.duration
+    return simulator